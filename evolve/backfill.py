@@ -0,0 +1,173 @@
+"""Chunked updates of a column in a live table.
+
+A backfill walks a table in primary key order, chunk_size rows at a time,
+and updates each chunk in its own short transaction, so the table is never
+locked or rewritten as a whole. DatabaseRepository uses it for online
+deploys of alter.modify and alter.add with defaults.
+"""
+from sqlalchemy import MetaData, Table, select, func, and_, or_
+from evolve.instrumentation import span
+import time
+
+
+class Progress(object):
+    """Rows done out of the rows counted when the backfill started"""
+    def __init__(self, table_name, column_name, total):
+        self.table = table_name
+        self.column = column_name
+        self.total = total
+        self.rows = 0
+        self.chunks = 0
+        self.start = time.time()
+
+    def advance(self, rows):
+        self.rows += rows
+        self.chunks += 1
+
+    @property
+    def seconds(self):
+        return time.time() - self.start
+
+    @property
+    def eta(self):
+        """Estimated seconds left, None until the first chunk is done"""
+        if not self.rows:
+            return None
+        remaining = max(self.total - self.rows, 0)
+        return remaining * self.seconds / self.rows
+
+    def report(self):
+        return {
+            "table": self.table,
+            "column": self.column,
+            "rows": self.rows,
+            "total": self.total,
+            "chunks": self.chunks,
+            "seconds": self.seconds,
+            "eta": self.eta
+        }
+
+    def __str__(self):
+        if self.total:
+            percent = 100.0 * min(self.rows, self.total) / self.total
+        else:
+            percent = 100.0
+        eta = self.eta
+        return "%s.%s: %d/%d rows (%.1f%%), %.1fs elapsed, eta %s" % (
+            self.table, self.column, self.rows, self.total, percent,
+            self.seconds, "?" if eta is None else "%.1fs" % eta)
+
+
+class Backfill(object):
+    """Update a column of table_name chunk by chunk.
+
+    Chunks are keyset paginated over the table's single column primary
+    key. Between chunks the backfill sleeps throttle seconds and calls
+    progress(Progress) if given.
+    """
+    def __init__(self, database, table_name, chunk_size=1000, throttle=0.0,
+            progress=None):
+        self.database = database
+        self.table_name = table_name
+        self.chunk_size = chunk_size
+        self.throttle = throttle
+        self.progress = progress
+
+    def reflect(self, bind=None):
+        metadata = MetaData(bind or self.database.engine)
+        return Table(self.table_name, metadata, autoload=True)
+
+    def key(self, table=None):
+        """Return the name of the primary key column, or None if the table
+        does not have a single column primary key"""
+        if table is None:
+            table = self.reflect()
+        keys = [column.name for column in table.columns if column.primary_key]
+        if len(keys) != 1:
+            return None
+        return keys[0]
+
+    def copy(self, source, target):
+        """Copy the values of column source into column target"""
+        table = self.reflect()
+        return self.run(table, target, table.c[source])
+
+    def fill(self, column_name, value):
+        """Set column_name to value where it is null"""
+        table = self.reflect()
+        column = table.c[column_name]
+        return self.run(table, column_name, value, column == None)
+
+    def catch_up(self, connection, source, target):
+        """Copy the values of source that differ from target, catching up
+        with writes made during a copy(). Runs over connection, as one
+        statement."""
+        table = self.reflect(connection)
+        source_column = table.c[source]
+        target_column = table.c[target]
+        # null-safe inequality, NULL != value is never true
+        differs = or_(source_column != target_column,
+            and_(target_column == None, source_column != None),
+            and_(source_column == None, target_column != None))
+        result = connection.execute(table.update().where(differs).values(
+            {target: source_column}))
+        return result.rowcount
+
+    def run(self, table, column_name, value, where=None):
+        key = table.c[self.key(table)]
+        engine = self.database.engine
+        total = engine.execute(
+            select([func.count()]).select_from(table)).scalar()
+        progress = Progress(self.table_name, column_name, total)
+        last = None
+        while True:
+            with span("Backfill.chunk", rows=0) as chunk_span:
+                upper, rows = self.run_chunk(table, key, column_name, value,
+                    where, last)
+                chunk_span.count("rows", rows)
+            if upper is None:
+                break
+            progress.advance(rows)
+            if self.progress:
+                self.progress(progress)
+            last = upper
+            if self.throttle:
+                time.sleep(self.throttle)
+        return progress
+
+    def run_chunk(self, table, key, column_name, value, where, last):
+        """Update the chunk of rows after key value last, in one
+        transaction. Returns the last key of the chunk, None when there
+        are no rows left, and the number of rows updated."""
+        connection = self.database.engine.connect()
+        try:
+            transaction = connection.begin()
+            try:
+                bounds = select([key]).order_by(key).offset(
+                    self.chunk_size - 1).limit(1)
+                conditions = []
+                if last is not None:
+                    bounds = bounds.where(key > last)
+                    conditions.append(key > last)
+                upper = connection.execute(bounds).scalar()
+                if upper is None:
+                    # the rest of the table fits in this chunk
+                    rest = select([func.max(key)])
+                    if last is not None:
+                        rest = rest.where(key > last)
+                    upper = connection.execute(rest).scalar()
+                    if upper is None:
+                        transaction.commit()
+                        return None, 0
+                conditions.append(key <= upper)
+                if where is not None:
+                    conditions.append(where)
+                result = connection.execute(table.update().where(
+                    and_(*conditions)).values({column_name: value}))
+                transaction.commit()
+            except:
+                transaction.rollback()
+                raise
+        finally:
+            connection.close()
+        return upper, result.rowcount
@@ -0,0 +1,203 @@
+"""Benchmarks for repository and schema operations.
+
+Run with: python -m evolve.bench --help
+"""
+from evolve.repository import Repository
+from evolve.graph import CommitGraph
+import gc
+import platform
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def column_name(table, column):
+    return "t%s_c%s" % (table, column)
+
+
+def create_change(table, columns):
+    properties = {}
+    for column in range(columns):
+        properties[column_name(table, column)] = {"type": "string", "maxLength": 40}
+    return {
+        "change": "create",
+        "schema": {"id": "t%s" % table, "type": "object", "properties": properties}
+    }
+
+
+def add_change(table, name):
+    return {
+        "change": "alter.add",
+        "schema": {
+            "id": "t%s" % table,
+            "type": "object",
+            "properties": {name: {"type": "string"}}
+        }
+    }
+
+
+def generate_repository(depth, branches, tables, columns, branch_depth=10):
+    """Build a synthetic repository.
+    
+    master creates the tables and then gets depth commits, each adding a 
+    column to one of the tables in turn. Each branch forks from master and 
+    adds branch_depth commits of its own.
+    """
+    repository = Repository()
+    repository.branch('master')
+    changes = [create_change(table, columns) for table in range(tables)]
+    repository.commit('master', changes, 'create tables')
+    for i in range(depth):
+        table = i % tables
+        repository.commit('master', [add_change(table, "m%s" % i)], 'commit %s' % i)
+        
+    for branch in range(branches):
+        branch_name = 'b%s' % branch
+        repository.branch(branch_name, 'master')
+        for i in range(branch_depth):
+            table = i % tables
+            name = "%s_%s" % (branch_name, i)
+            repository.commit(branch_name, [add_change(table, name)], 
+                '%s commit %s' % (branch_name, i))
+    return repository
+
+
+class Measurement(object):
+    """Time a callable and report the peak memory it used.
+    
+    The timed runs are not traced, tracing allocations slows Python code 
+    down several times. The peak is measured in one more, traced run.
+    """
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        
+    def run(self, func):
+        times = []
+        for i in range(self.repeat):
+            gc.collect()
+            start = time.time()
+            func()
+            times.append(time.time() - start)
+        return {
+            "min": min(times),
+            "mean": sum(times) / len(times),
+            "max": max(times),
+            "repeat": self.repeat,
+            "peak_memory": self.peak_memory(func)
+        }
+        
+    def peak_memory(self, func):
+        if tracemalloc is None:
+            if resource is None:
+                return None
+            # only the process high water mark is available, in KB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+
+def benchmark(depth, branches, tables, columns, repeat=3):
+    """Time the repository operations on a generated repository.
+    
+    Returns a list of result dicts.
+    """
+    params = {
+        "depth": depth,
+        "branches": branches,
+        "tables": tables,
+        "columns": columns
+    }
+    measurement = Measurement(repeat)
+    results = []
+    
+    def record(operation, func):
+        result = measurement.run(func)
+        result["operation"] = operation
+        result["params"] = params
+        results.append(result)
+    
+    start = time.time()
+    repository = generate_repository(depth, branches, tables, columns)
+    elapsed = time.time() - start
+    results.append({
+        "operation": "generate",
+        "params": params,
+        "min": elapsed,
+        "mean": elapsed,
+        "max": elapsed,
+        "repeat": 1,
+        "peak_memory": None
+    })
+    
+    head = repository.branches['master']
+    
+    def checkout_cold():
+        repository.snapshot_cache.clear()
+        repository.checkout_commit(head)
+    record("checkout_commit (cold)", checkout_cold)
+    
+    def checkout_replay():
+        # without persisted snapshots every changelog back to the root is 
+        # replayed
+        snapshots = repository.snapshots
+        repository.snapshots = {}
+        repository.snapshot_cache.clear()
+        try:
+            repository.checkout_commit(head)
+        finally:
+            repository.snapshots = snapshots
+    record("checkout_commit (full replay)", checkout_replay)
+    record("checkout_commit (cached)", lambda: repository.checkout_commit(head))
+    
+    counter = [0]
+    def commit():
+        counter[0] += 1
+        repository.branch('bench%s' % counter[0], 'master')
+        repository.commit('bench%s' % counter[0], 
+            [add_change(0, "bench%s" % counter[0])], 'bench')
+    record("commit", commit)
+    
+    if branches >= 2:
+        one = repository.branches['b0']
+        two = repository.branches['b1']
+        def find_common_parent_cold():
+            repository.graph = CommitGraph()
+            repository.find_common_parent(one, two)
+        record("find_common_parent (cold)", find_common_parent_cold)
+        record("find_common_parent (indexed)", 
+            lambda: repository.find_common_parent(one, two))
+        record("migrate", lambda: repository.migrate(one, two))
+        record("migrate (compact)", 
+            lambda: repository.migrate(one, two, compact=True))
+    
+    schema = repository.checkout_commit(head).schema
+    changes = [add_change(i % tables, "add%s" % i) for i in range(100)]
+    def schema_add():
+        copied = schema.copy()
+        for change in changes:
+            copied.add(change)
+    record("Schema.add x100", schema_add)
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "argv": sys.argv
+    }
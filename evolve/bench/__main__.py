@@ -0,0 +1,56 @@
+from evolve.bench import benchmark
+from evolve.bench import environment
+import argparse
+import itertools
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+def positive(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, got %s" % value)
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m evolve.bench",
+        description="Time evolve repository operations on synthetic repositories.")
+    parser.add_argument("--depth", type=int, nargs="+", default=[10, 100, 1000],
+        help="number of commits on master")
+    parser.add_argument("--branches", type=int, nargs="+", default=[2],
+        help="number of branches forked from master")
+    parser.add_argument("--tables", type=positive, nargs="+", default=[10],
+        help="number of tables")
+    parser.add_argument("--columns", type=positive, nargs="+", default=[10],
+        help="number of columns per table")
+    parser.add_argument("--repeat", type=int, default=3,
+        help="number of timed runs per operation")
+    parser.add_argument("--output", 
+        help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    
+    results = []
+    for depth, branches, tables, columns in itertools.product(
+            args.depth, args.branches, args.tables, args.columns):
+        for result in benchmark(depth, branches, tables, columns, args.repeat):
+            results.append(result)
+            params = result["params"]
+            print("depth=%-6s branches=%-3s tables=%-4s columns=%-4s %-26s %10.3f ms" % (
+                params["depth"], params["branches"], params["tables"], 
+                params["columns"], result["operation"], result["min"] * 1000))
+    
+    if args.output:
+        f = open(args.output, "w")
+        try:
+            json.dump({"environment": environment(), "results": results}, 
+                f, indent=4, sort_keys=True)
+        finally:
+            f.close()
+
+
+if __name__ == "__main__":
+    main()
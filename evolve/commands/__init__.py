@@ -1,35 +1,81 @@
-import os
 import sys
+import time
 
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
 
-commands = []
-script_path = os.path.dirname(__file__)
-for f in os.listdir(script_path):
-    file_path = os.path.join(script_path, f)
-    if os.path.isfile(file_path):
-        parts = f.split('.')
-        command = parts[0]
-        extension = parts[1]
-        if extension == 'py' and command != '__init__':
-            commands.append(command)
+
+# command name -> module, a module is only imported when its command runs
+commands = {
+    'clone': 'evolve.commands.clone',
+    'deploy': 'evolve.commands.deploy',
+    'init': 'evolve.commands.init',
+    'pack': 'evolve.commands.pack',
+    'push': 'evolve.commands.push',
+    'verify': 'evolve.commands.verify',
+}
+
+
+class ImportProfiler(object):
+    """Record the time spent on the first import of every module.
+    
+    Times are cumulative, a module's time includes the modules it imports.
+    """
+    def __init__(self):
+        self.timings = []
+        self.original_import = None
+        
+    def install(self):
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+        
+    def uninstall(self):
+        builtins.__import__ = self.original_import
+        
+    def timed_import(self, name, *args, **kwargs):
+        if name in sys.modules:
+            return self.original_import(name, *args, **kwargs)
+        start = time.time()
+        try:
+            return self.original_import(name, *args, **kwargs)
+        finally:
+            self.timings.append((time.time() - start, name))
+            
+    def report(self, out=None):
+        out = out or sys.stderr
+        out.write("Import time per module (cumulative):\n")
+        for elapsed, name in sorted(self.timings, reverse=True):
+            out.write("%8.2f ms  %s\n" % (elapsed * 1000, name))
 
 
 def usage():
+    print("Usage: evolve [--profile-startup] command")
     print("Available commands:")
-    for command in commands:
+    for command in sorted(commands):
         print(command)
 
 def run_cmd(command):
     if command in commands:
-        _mod = __import__("evolve.commands.%s" % command, fromlist=['run'])
+        _mod = __import__(commands[command], fromlist=['run'])
         _mod.run()
     else:
         usage()
 
 
 def run():
+    profiler = None
+    if '--profile-startup' in sys.argv:
+        sys.argv.remove('--profile-startup')
+        profiler = ImportProfiler()
+        profiler.install()
     try:
-        command = sys.argv[1]
-        run_cmd(command)
-    except IndexError:
-        usage()
\ No newline at end of file
+        if len(sys.argv) < 2:
+            usage()
+        else:
+            run_cmd(sys.argv[1])
+    finally:
+        if profiler:
+            profiler.uninstall()
+            profiler.report()
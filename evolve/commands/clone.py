@@ -0,0 +1,33 @@
+import sys
+from evolve.file_repository import FileRepository
+from evolve.exceptions import RepositoryNotFound
+
+
+def usage():
+    print("Usage: evolve clone dburl")
+
+def clone(target, directory='.'):
+    # SQLAlchemy and migrate are slow to import, only load them for databases
+    from evolve.database_repository import DatabaseRepository
+    repo = FileRepository()
+    if repo.is_repository(directory):
+        print("Error: Repository already exists at the current location")
+        return False
+    try:
+        repository = DatabaseRepository(target).clone()
+    except RepositoryNotFound:
+        print("Error: No repository found in the specified database")
+        return False
+    repo.initialize(directory)
+    repo.save(directory, repository)
+    print("Cloned %s commits" % (len(repository.commits) - 1))
+    return True
+
+def run():
+    try:
+        target = sys.argv[2]
+    except IndexError:
+        usage()
+        return
+    if not clone(target):
+        sys.exit(1)
@@ -0,0 +1,50 @@
+import sys
+from evolve.file_repository import FileRepository
+from evolve.exceptions import RepositoryNotFound
+
+
+def usage():
+    print("Usage: evolve deploy dburl branch_name [--resume]")
+
+def deploy(target, branch_name, directory='.', resume=False):
+    """Deploy the head of branch_name to the database at target. The
+    branch is read from the repository in directory, or from the database
+    when there is none. With resume, steps are checkpointed even where DDL
+    is transactional and the steps a failed deploy completed are skipped."""
+    # SQLAlchemy and migrate are slow to import, only load them for databases
+    from evolve.database_repository import DatabaseRepository
+    database_repository = DatabaseRepository(target)
+    repo = FileRepository()
+    try:
+        if repo.is_repository(directory):
+            repository = repo.load(directory)
+        else:
+            repository = database_repository.clone()
+        try:
+            commit_id = repository.branches[branch_name]
+        except KeyError:
+            print("Error: Could not find the %s branch" % branch_name)
+            return False
+        timings = database_repository.deploy_commit(repository, commit_id,
+            resume=resume)
+    except RepositoryNotFound:
+        print("Error: No repository found in the specified database, "
+            "run evolve init %s first" % target)
+        return False
+    if not timings:
+        print("Already at %s" % commit_id)
+    for timing in timings:
+        print("%s: %s (%.3fs)" % (timing["table"], ", ".join(timing["changes"]),
+            timing["seconds"]))
+    return True
+
+def run():
+    args = [arg for arg in sys.argv[2:] if arg != '--resume']
+    try:
+        target = args[0]
+        branch_name = args[1]
+    except IndexError:
+        usage()
+        return
+    if not deploy(target, branch_name, resume='--resume' in sys.argv):
+        sys.exit(1)
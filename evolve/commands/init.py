@@ -1,9 +1,7 @@
 import sys
 import os
 from evolve.file_repository import FileRepository
-from evolve.database_repository import DatabaseRepository
 from evolve.exceptions import RepositoryAlreadyExists
-from sqlalchemy import exc
 
 
 def usage():
@@ -18,6 +16,9 @@ def init_file():
         usage()
 
 def init_db(target):
+    # SQLAlchemy and migrate are slow to import, only load them for databases
+    from evolve.database_repository import DatabaseRepository
+    from sqlalchemy import exc
     try:
         repo = DatabaseRepository(target)
         repo.initialize()
@@ -0,0 +1,14 @@
+from evolve.file_repository import FileRepository
+
+
+def usage():
+    print("Usage: evolve pack")
+
+def run():
+    repo = FileRepository()
+    if not repo.is_repository('.'):
+        print("Error: No repository found at the current location")
+        usage()
+        return
+    count = repo.pack('.')
+    print("Packed %s objects" % count)
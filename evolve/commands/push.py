@@ -0,0 +1,42 @@
+import sys
+from evolve.file_repository import FileRepository
+from evolve.exceptions import RepositoryNotFound
+
+
+def usage():
+    print("Usage: evolve push dburl [branch_name]")
+
+def push(target, branch_name=None, directory='.'):
+    # SQLAlchemy and migrate are slow to import, only load them for databases
+    from evolve.database_repository import DatabaseRepository
+    repo = FileRepository()
+    if not repo.is_repository(directory):
+        print("Error: No repository found at the current location")
+        return False
+    repository = repo.load(directory)
+    branches = None
+    if branch_name:
+        if branch_name not in repository.branches:
+            print("Error: Could not find the %s branch" % branch_name)
+            return False
+        branches = [branch_name]
+    try:
+        count = DatabaseRepository(target).push(repository, branches)
+    except RepositoryNotFound:
+        print("Error: No repository found in the specified database, "
+            "run evolve init %s first" % target)
+        return False
+    print("Pushed %s objects" % count)
+    return True
+
+def run():
+    try:
+        target = sys.argv[2]
+    except IndexError:
+        usage()
+        return
+    branch_name = None
+    if len(sys.argv) > 3:
+        branch_name = sys.argv[3]
+    if not push(target, branch_name):
+        sys.exit(1)
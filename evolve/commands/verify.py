@@ -1,22 +1,48 @@
 import sys
 import os
 from evolve.file_repository import FileRepository
+from evolve.exceptions import BranchNotFound
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 
 def usage():
     print("Usage: evolve verify branch_name changes.json")
 
 def verify_changes(branch_name, changes):
-    path = os.path.dirname(changes)
-    repo = os.path.join(path, 'evolve.json')
-    # load repo from file
-    # checkout branch
-    # verify changes
+    path = os.path.dirname(changes) or '.'
+    repo = FileRepository()
+    if not repo.is_repository(path):
+        print("Error: No repository found at %s" % path)
+        return False
+    # only the head of the branch and its short tail are read
+    repository = repo.load(path)
+    try:
+        commit = repository.checkout_branch(branch_name)
+    except BranchNotFound:
+        print("Error: Could not find the %s branch" % branch_name)
+        return False
+        
+    f = open(changes, 'r')
+    try:
+        changes_data = json.load(f)
+    finally:
+        f.close()
+        
+    violations = commit.schema.verify_batch(changes_data['changes'])
+    for violation in violations:
+        print("Invalid change %(index)s (%(change)s): %(message)s" % violation)
+    return not violations
 
 def run():
     try:
         branch_name = sys.argv[2]
         changes = sys.argv[3]
-        verify_changes(branch_name, changes)
     except IndexError:
         usage()
+        return
+    if not verify_changes(branch_name, changes):
+        sys.exit(1)
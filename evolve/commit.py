@@ -6,11 +6,40 @@ import copy
 
 class Commit(object):
     def __init__(self):
-        self.parent = None
+        self.parent_id = None
+        self.parent_loader = None
+        self._parent = None
         self.changelog = []
-        self.schema = None
         self.commit_id = None
         self.msg = None
+        self.schema_loader = None
+        self._schema = None
+
+    def get_schema(self):
+        """Return the schema, materializing it on first access"""
+        if self._schema is None and self.schema_loader:
+            self._schema = self.schema_loader(self.commit_id)
+        return self._schema
+
+    def set_schema(self, schema):
+        self._schema = schema
+
+    schema = property(get_schema, set_schema)
+    
+    def get_parent(self):
+        """Return the parent commit, loading it on first access"""
+        if self._parent is None and self.parent_id and self.parent_loader:
+            self._parent = self.parent_loader(self.parent_id)
+        return self._parent
+        
+    def set_parent(self, parent):
+        self._parent = parent
+        if parent:
+            self.parent_id = parent.commit_id
+        else:
+            self.parent_id = None
+        
+    parent = property(get_parent, set_parent)
         
     def to_dict(self):
         dct = {
@@ -18,15 +47,16 @@ class Commit(object):
             'msg':self.msg
         }
         
-        if self.parent:
-            dct['parent'] = self.parent.commit_id
+        if self.parent_id:
+            dct['parent'] = self.parent_id
             
         return dct
     
     def get_ancestors(self):
-        if self.parent:
-            parents = self.parent.get_ancestors()
-            parents.append(self.commit_id)
-            return parents
-        else:
-            return [self.commit_id]
\ No newline at end of file
+        ancestors = []
+        commit = self
+        while commit:
+            ancestors.append(commit.commit_id)
+            commit = commit.parent
+        ancestors.reverse()
+        return ancestors
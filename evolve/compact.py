@@ -0,0 +1,217 @@
+from evolve.schema import Schema
+import copy
+
+
+class MigrationCompactor(object):
+    """Collapse redundant changes in a migration before it is deployed.
+
+    Changes are grouped per table. Tables that are created and dropped
+    within the migration disappear, tables that are dropped lose the work
+    done before the drop, created tables absorb their later alters and the
+    alters of existing tables are reduced to their net effect on each
+    field. Applying the compacted changes to a schema gives the same
+    result as applying the original changes.
+    """
+    def compact(self, changes):
+        tables = []
+        table_changes = {}
+        for change in changes:
+            table = change['schema']['id']
+            if table not in table_changes:
+                tables.append(table)
+                table_changes[table] = []
+            table_changes[table].append(change)
+
+        compacted = []
+        for table in tables:
+            for segment in self.split_segments(table_changes[table]):
+                compacted.extend(self.compact_segment(table, segment))
+        return compacted
+
+    def split_segments(self, changes):
+        """Split the changes to one table at each create and drop"""
+        segments = []
+        segment = None
+        for change in changes:
+            action = change['change']
+            if segment is None or action == 'create' or segment['dropped']:
+                segment = {'created': None, 'changes': [], 'dropped': None}
+                segments.append(segment)
+            if action == 'create':
+                segment['created'] = change
+            elif action == 'drop':
+                segment['dropped'] = change
+            else:
+                segment['changes'].append(change)
+        return segments
+
+    def compact_segment(self, table, segment):
+        created = segment['created']
+        dropped = segment['dropped']
+        changes = segment['changes']
+
+        if created and dropped:
+            return []
+
+        if dropped:
+            return [copy.deepcopy(dropped)]
+
+        if created:
+            schema = Schema()
+            schema.add(copy.deepcopy(created))
+            for change in changes:
+                schema.add(copy.deepcopy(change))
+            return [{'change': 'create', 'schema': schema.tables[table]}]
+
+        compacted = self.compact_fields(table, changes)
+        if compacted is None:
+            # the net effect can't be expressed safely, keep the changes
+            return [copy.deepcopy(change) for change in changes]
+        return compacted
+
+    def compact_fields(self, table, changes):
+        """Reduce the alters of an existing table to their net effect.
+
+        Returns None when the changes can't be reduced.
+        """
+        fields = {}
+        touched = set()
+        dropped = []
+
+        def lookup(name):
+            if name in fields:
+                return fields[name]
+            if name in touched:
+                return None
+            touched.add(name)
+            fields[name] = {
+                'origin': name,
+                'definition': None,
+                'original': None,
+                'modified': False
+            }
+            return fields[name]
+
+        for change in changes:
+            action = change['change']
+            properties = change['schema']['properties']
+            for name, definition in properties.items():
+                if action == 'alter.add':
+                    if name in fields:
+                        return None
+                    touched.add(name)
+                    fields[name] = {
+                        'origin': None,
+                        'definition': copy.deepcopy(definition),
+                        'original': None,
+                        'modified': False
+                    }
+
+                elif action == 'alter.drop':
+                    state = lookup(name)
+                    if state is None:
+                        return None
+                    del fields[name]
+                    if state['origin'] is not None:
+                        original = state['original']
+                        if original is None:
+                            original = copy.deepcopy(definition)
+                        dropped.append((state['origin'], original))
+
+                elif action == 'alter.rename':
+                    state = lookup(name)
+                    if state is None or definition in fields:
+                        return None
+                    del fields[name]
+                    touched.add(definition)
+                    fields[definition] = state
+
+                elif action == 'alter.modify':
+                    state = lookup(name)
+                    if state is None:
+                        return None
+                    if state['origin'] is not None and not state['modified']:
+                        old_schema = change.get('old_schema', {})
+                        old_properties = old_schema.get('properties', {})
+                        if name not in old_properties:
+                            return None
+                        state['original'] = copy.deepcopy(old_properties[name])
+                        state['modified'] = True
+                    state['definition'] = copy.deepcopy(definition)
+
+                else:
+                    return None
+
+        _type = changes[0]['schema'].get('type', 'object') if changes else 'object'
+
+        def change_for(action, properties, old_properties=None):
+            change = {
+                'change': action,
+                'schema': {'id': table, 'type': _type, 'properties': properties}
+            }
+            if old_properties is not None:
+                change['old_schema'] = {
+                    'id': table, 'type': _type, 'properties': old_properties
+                }
+            return change
+
+        compacted = []
+        if dropped:
+            compacted.append(change_for('alter.drop', dict(dropped)))
+
+        renames = {}
+        for name, state in fields.items():
+            if state['origin'] is not None and state['origin'] != name:
+                renames[state['origin']] = name
+        # a rename can only run once the rename freeing its target has run
+        while renames:
+            wave = dict((origin, name) for origin, name in renames.items()
+                if name not in renames)
+            if not wave:
+                return None
+            compacted.append(change_for('alter.rename', wave))
+            for origin in wave:
+                del renames[origin]
+
+        modified = {}
+        original = {}
+        added = {}
+        for name, state in fields.items():
+            if state['origin'] is None:
+                added[name] = state['definition']
+            elif state['modified'] and state['definition'] != state['original']:
+                modified[name] = state['definition']
+                original[name] = state['original']
+        if modified:
+            compacted.append(change_for('alter.modify', modified, original))
+        if added:
+            compacted.append(change_for('alter.add', added))
+
+        return compacted
+
+
+def compact(changes):
+    """Return the compacted form of the list of changes"""
+    return MigrationCompactor().compact(changes)
+
+
+def summarize(changes):
+    """Return the per table, per column effect of a list of changes.
+
+    The result maps each table to {action: properties} where action is
+    the change action. Modified columns map to {"from": old property, 
+    "to": new property}, old property being None when it is unknown.
+    """
+    summary = {}
+    for change in changes:
+        action = change['change']
+        table = change['schema']['id']
+        properties = change['schema'].get('properties', {})
+        entry = summary.setdefault(table, {}).setdefault(action, {})
+        if action == 'alter.modify':
+            old_properties = change.get('old_schema', {}).get('properties', {})
+            for name, prop in properties.items():
+                entry[name] = {'from': old_properties.get(name), 'to': prop}
+        else:
+            entry.update(properties)
+    return summary
@@ -1,27 +1,148 @@
 from evolve.exceptions import RepositoryAlreadyExists
+from evolve.exceptions import RepositoryNotFound
 from evolve.db import Database
+from evolve.backfill import Backfill
+from evolve.instrumentation import span
+from evolve.repository import Repository
+from evolve.storage import Storage
+from evolve import hashing
+from evolve.steps import plan_steps
+from sqlalchemy import MetaData, Table, select, and_
+import sqlalchemy.exc
+from contextlib import contextmanager
+import copy
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 
 class DatabaseRepository(object):
-    def __init__(self, dbstring):
-        self.database = Database(dbstring)
+    # dialects whose plans are always deployed serially, SQLite locks the
+    # whole database for DDL so concurrent steps would only wait on it
+    serial_dialects = ['sqlite']
+    
+    def __init__(self, dbstring, workers=1, online=False, chunk_size=1000, 
+            throttle=0.0, progress=None):
+        self.workers = workers
+        self.online = online
+        self.chunk_size = chunk_size
+        self.throttle = throttle
+        self.progress = progress
+        pool_size = None
+        if workers > 1:
+            pool_size = workers
+        self.database = Database(dbstring, pool_size=pool_size)
+        self._storage = None
+        
+    def worker(self):
+        """Return a repository deploying through its own Database worker. 
+        The worker has a storage of its own, so checkpoints are written over 
+        the worker's connection."""
+        worker = copy.copy(self)
+        worker.database = self.database.worker()
+        worker._storage = DatabaseStorage(worker.database)
+        return worker
         
     def initialize(self):
-        props = {
-            "type": {"type": "string", "maxLength": 40},
-            "key": {"type": "string", "maxLength": 40},
-            "value": {"type": "string"},
-        }
         table = self.database.table('_evolve')
         if table.exists():
             raise RepositoryAlreadyExists()
         else:
-            for name, prop in props.items():
+            for name, prop in DatabaseStorage.properties.items():
                 column = self.get_column(name, prop)
                 table.append_column(column)
             table.create()
+            
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = DatabaseStorage(self.database)
+        return self._storage
+        
+    def push(self, repository, branches=None):
+        """Write the commits, changes and snapshots of repository missing 
+        from the database, then point branches, by default every branch, 
+        at their heads. Runs in one transaction where DDL is transactional.
+        
+        Returns the number of objects written.
+        """
+        storage = self.storage
+        if branches is None:
+            branches = list(repository.branches.keys())
+        with span("DatabaseRepository.push") as timing:
+            with self.database.connect():
+                known = storage.known()
+                objects = []
+                for _type, items in [('commit', repository.commits), 
+                        ('change', repository.changes), 
+                        ('snapshot', repository.snapshots)]:
+                    for object_id in items:
+                        if object_id != 'root' and (_type, object_id) not in known:
+                            objects.append((_type, object_id, items[object_id]))
+                written = storage.put_many(objects)
+                storage.set_branches(dict((branch_name, repository.branches[branch_name])
+                    for branch_name in branches))
+            timing.count('objects', written)
+        return written
+        
+    def clone(self):
+        """Return a Repository of the objects and branches in the database, 
+        read with a single select"""
+        storage = self.storage
+        with span("DatabaseRepository.clone"):
+            storage.load()
+            repository = Repository(storage=storage)
+            repository.branches.update(storage.branches())
+        return repository
     
+    def deployed_commit(self):
+        """Return the id of the commit the database was last deployed to, 
+        None if it was never deployed. Costs a single query."""
+        return self.storage.read('deployed', 'commit')
+        
+    def deploy_commit(self, repository, commit_id, workers=None,
+            checkpoint=None, resume=False):
+        """Deploy commit_id of repository, applying only the migration from 
+        the deployed commit. The deployed commit is recorded with the plan. 
+        Steps are checkpointed by default where DDL is not transactional or 
+        more than one worker deploys lanes, each in a transaction of its 
+        own. Otherwise a failed plan rolls back as a whole, see 
+        deploy_plan().
+        
+        Returns the step timings, no steps when the database is already at 
+        commit_id.
+        """
+        current = self.deployed_commit()
+        if current == commit_id:
+            return []
+        if checkpoint is None:
+            checkpoint = (not self.database.transactional_ddl or 
+                (workers or self.workers) > 1)
+        with span("DatabaseRepository.deploy_commit"):
+            changes = repository.migrate(current or 'root', commit_id, 
+                compact=True)
+            return self.deploy_plan(changes, workers, commit_id=commit_id,
+                checkpoint=checkpoint, resume=resume)
+            
     def deploy(self, change):
+        name = "DatabaseRepository.deploy_%s" % change["change"].replace(".", "_")
+        columns = len(change["schema"].get("properties", {}))
+        with span(name, columns=columns):
+            self.deploy_change(change)
+            
+    def deploy_change(self, change):
+        if self.is_backfilled(change):
+            self.deploy_backfill(change)
+            return
         if change["change"] == "create":
             self.deploy_create(change["schema"])
         if change["change"] == "drop":
@@ -35,6 +156,310 @@ class DatabaseRepository(object):
         if change["change"] == "alter.drop":
             self.deploy_alter_drop(change["schema"])
             
+    def deploy_plan(self, changes, workers=None, commit_id=None,
+            checkpoint=False, resume=False):
+        """Deploy a list of changes, e.g. the result of Repository.migrate.
+        
+        Consecutive changes to the same table are deployed together as one 
+        step, see plan_steps(). With one worker the plan runs over a single 
+        connection and, on backends with transactional DDL, in a single 
+        transaction. Online plans do not hold a connection, every statement 
+        commits on its own, see deploy_backfill(). With more workers, and 
+        more than one lane, the lanes of plan_lanes() are deployed 
+        concurrently, see deploy_parallel().
+        
+        With checkpoint, every step is committed on its own together with a 
+        checkpoint, see checkpoint_step(), and the steps a failed deploy of 
+        the same plan checkpointed are skipped. resume implies checkpoint.
+        
+        When commit_id is given it is recorded as the deployed commit after 
+        the last step, in the plan's transaction when there is one.
+        
+        Returns a list of the timings of the deployed steps in plan order.
+        """
+        if workers is None:
+            workers = self.workers
+        with span("DatabaseRepository.deploy_plan", changes=len(changes)):
+            steps = self.plan_steps(changes)
+            plan_id = None
+            done = set()
+            if checkpoint or resume:
+                plan_id = self.plan_id(changes, commit_id)
+                done = self.completed_steps(plan_id, len(steps))
+            lanes = []
+            for lane in self.plan_lanes(steps):
+                lane = [index for index in lane if index not in done]
+                if lane:
+                    lanes.append(lane)
+            self.database.forget_all()
+            
+            if (workers > 1 and len(lanes) > 1 and 
+                    self.database.dialect_name not in self.serial_dialects):
+                timings = self.deploy_parallel(steps, lanes, workers, plan_id)
+            elif plan_id:
+                timings = [None] * len(steps)
+                remaining = [index for index in range(len(steps)) 
+                    if index not in done]
+                self.deploy_lane(steps, remaining, timings, plan_id)
+            else:
+                timings = [None] * len(steps)
+                with self.plan_connection():
+                    self.deploy_lane(steps, range(len(steps)), timings)
+                    if commit_id:
+                        self.storage.write('deployed', 'commit', commit_id)
+                return timings
+                
+            with self.plan_connection():
+                if commit_id:
+                    self.storage.write('deployed', 'commit', commit_id)
+                if plan_id:
+                    self.clear_checkpoints(plan_id, len(steps))
+            return [timing for timing in timings if timing is not None]
+            
+    def deploy_lane(self, steps, lane, timings, plan_id=None):
+        """Deploy the steps of lane, indexes into steps, storing their 
+        timings in timings. Without plan_id the steps run over the current 
+        connection, with plan_id each step runs in a transaction of its own 
+        together with its checkpoint, see step_transaction()."""
+        self.database.prefetch([steps[index][0] for index in lane])
+        for index in lane:
+            table_name, step = steps[index]
+            try:
+                if plan_id is None:
+                    timings[index] = self.deploy_timed_step(table_name, step)
+                    continue
+                with self.step_transaction():
+                    timings[index] = self.deploy_timed_step(table_name, step)
+                    self.checkpoint_step(plan_id, index, step)
+            except:
+                # the cached table may hold columns the failed step added
+                self.database.forget(table_name)
+                raise
+                
+    def step_transaction(self):
+        """Transaction of a checkpointed step, on every dialect and not only 
+        where plans run in one, so a step is never committed without its 
+        checkpoint. Online steps commit statement by statement, as in 
+        plan_connection()."""
+        if self.online:
+            return self.plan_connection()
+        return self.database.transaction()
+        
+    def plan_id(self, changes, commit_id=None):
+        """Id of a plan, the same for the same changes to the same commit"""
+        return hashing.change_id([commit_id, changes])
+        
+    def checkpoint_key(self, plan_id, index):
+        return hashing.change_id([plan_id, index])
+        
+    def checkpoint_step(self, plan_id, index, step):
+        """Record that step index of plan_id was deployed, as one row in 
+        _evolve so lanes deployed concurrently never update the same row. 
+        Called inside the step's plan_connection(), the row is written over 
+        the step's connection and in its transaction."""
+        self.storage.append('checkpoint', self.checkpoint_key(plan_id, index), {
+            "plan": plan_id,
+            "step": index,
+            "changes": [hashing.change_id(change) for change in step]
+        })
+        
+    def completed_steps(self, plan_id, count):
+        """Return the indexes of the checkpointed steps of plan_id, read 
+        with a single query"""
+        keys = [self.checkpoint_key(plan_id, index) for index in range(count)]
+        checkpoints = self.storage.read_many('checkpoint', keys)
+        return set(checkpoint["step"] for checkpoint in checkpoints.values())
+        
+    def clear_checkpoints(self, plan_id, count):
+        self.storage.delete_many('checkpoint', 
+            [self.checkpoint_key(plan_id, index) for index in range(count)])
+        
+    @contextmanager
+    def plan_connection(self):
+        if self.online:
+            yield None
+            return
+        with self.database.connect() as connection:
+            yield connection
+                    
+    def deploy_timed_step(self, table_name, step):
+        start = time.time()
+        with span("DatabaseRepository.deploy_step", changes=len(step)):
+            self.deploy_step(table_name, step)
+        return {
+            "table": table_name,
+            "changes": [change["change"] for change in step],
+            "seconds": time.time() - start
+        }
+        
+    def plan_lanes(self, steps):
+        """Split steps into lanes that can be deployed independently.
+        
+        A lane holds the indexes of every step of one table, in plan order. 
+        Tables do not reference each other, so the order between steps of 
+        different tables does not matter. Returns a list of lanes ordered 
+        by their first step.
+        """
+        lanes = []
+        by_table = {}
+        for index, (table_name, step) in enumerate(steps):
+            if table_name not in by_table:
+                by_table[table_name] = []
+                lanes.append(by_table[table_name])
+            by_table[table_name].append(index)
+        return lanes
+        
+    def deploy_parallel(self, steps, lanes, workers, plan_id=None):
+        """Deploy lanes concurrently from at most workers threads.
+        
+        Each thread takes one pooled connection and deploys whole lanes 
+        over it, with tables cached in its own metadata. Each lane runs in 
+        its own transaction where DDL is transactional, or each step when 
+        checkpointed, see deploy_lane(). After a failure no new lane is 
+        started, the first error is raised once the running lanes are done.
+        
+        Returns the step timings, None for the steps not in lanes.
+        """
+        pending = queue.Queue()
+        for lane in lanes:
+            pending.put(lane)
+        timings = [None] * len(steps)
+        errors = []
+        
+        def run(repository):
+            while not errors:
+                try:
+                    lane = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    if plan_id:
+                        repository.deploy_lane(steps, lane, timings, plan_id)
+                    else:
+                        with repository.plan_connection():
+                            repository.deploy_lane(steps, lane, timings)
+                except Exception as e:
+                    errors.append(e)
+                    
+        threads = []
+        for i in range(min(workers, len(lanes))):
+            thread = threading.Thread(target=run, args=(self.worker(), ))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return timings
+        
+    def plan_steps(self, changes):
+        """Group consecutive changes to the same table into steps.
+        
+        Within a step, consecutive alters of the same kind are merged into 
+        one change. Returns a list of (table name, changes) tuples, see 
+        evolve.steps.
+        """
+        return plan_steps(changes)
+        
+    def deploy_step(self, table_name, changes):
+        rebuilt = ["alter.drop", "alter.rename", "alter.modify"]
+        if self.database.dialect_name == "sqlite":
+            alters = [change for change in changes 
+                if change["change"] in rebuilt and not self.is_backfilled(change)]
+            if alters:
+                self.deploy_rebuild(table_name, changes)
+                return
+        for change in changes:
+            self.deploy(change)
+            
+    def deploy_rebuild(self, table_name, changes):
+        """Deploy a step of SQLite alters as a single table rebuild. A create 
+        or drop within the step, or a backfilled alter, is deployed on its 
+        own."""
+        batch = []
+        for change in changes:
+            if (change["change"].startswith("alter.") and 
+                    not self.is_backfilled(change)):
+                batch.append(change)
+                continue
+            if batch:
+                self.rebuild_table(table_name, batch)
+                batch = []
+            self.deploy(change)
+        if batch:
+            self.rebuild_table(table_name, batch)
+            
+    def rebuild_table(self, table_name, changes):
+        with span("DatabaseRepository.rebuild_table", changes=len(changes)):
+            self.database.rebuild_table(table_name, changes)
+        
+    def is_backfilled(self, change):
+        """Online deploys backfill alter.modify and alter.add of properties 
+        with a default"""
+        if not self.online:
+            return False
+        if change["change"] == "alter.modify":
+            return True
+        if change["change"] == "alter.add":
+            for prop in change["schema"]["properties"].values():
+                if "default" in prop:
+                    return True
+        return False
+        
+    def backfill(self, table_name):
+        return Backfill(self.database, table_name, chunk_size=self.chunk_size,
+            throttle=self.throttle, progress=self.progress)
+        
+    def deploy_backfill(self, change):
+        schema = change["schema"]
+        if change["change"] == "alter.modify":
+            self.deploy_online_modify(schema)
+        else:
+            self.deploy_online_add(schema)
+            
+    def deploy_online_add(self, schema):
+        """Add the columns, then fill in their defaults chunk by chunk"""
+        self.deploy_alter_add(schema)
+        backfill = self.backfill(schema["id"])
+        if backfill.key() is None:
+            return
+        for name, prop in schema["properties"].items():
+            if "default" in prop:
+                backfill.fill(name, prop["default"])
+        
+    def deploy_online_modify(self, schema):
+        """Modify columns through a shadow column.
+        
+        The new definition is added as a shadow column, the values are 
+        copied into it chunk by chunk, then in one short transaction writes 
+        made meanwhile are caught up and the shadow column replaces the old 
+        one, with the table locked, see Database.lock_table(). Tables 
+        without a single column primary key, and the key itself, are 
+        modified in place.
+        """
+        table_name = schema["id"]
+        backfill = self.backfill(table_name)
+        key = backfill.key()
+        for name, prop in schema["properties"].items():
+            if key is None or name == key:
+                self.deploy_alter_modify(
+                    {"id": table_name, "properties": {name: prop}})
+                continue
+            shadow = "_evolve_shadow_%s" % name
+            shadow_prop = dict(prop)
+            shadow_prop.pop("identity", None)
+            self.deploy_alter_add(
+                {"id": table_name, "properties": {shadow: shadow_prop}})
+            backfill.copy(name, shadow)
+            with self.database.lock_table(table_name) as connection:
+                backfill.catch_up(connection, name, shadow)
+                self.deploy_step(table_name, [
+                    {"change": "alter.drop", 
+                        "schema": {"id": table_name, "properties": {name: prop}}},
+                    {"change": "alter.rename", 
+                        "schema": {"id": table_name, "properties": {shadow: name}}}
+                ])
+        
     def deploy_create(self, schema):
         table = self.get_table(schema)
         for name, prop in schema["properties"].items():
@@ -45,34 +470,214 @@ class DatabaseRepository(object):
     def deploy_drop(self, schema):
         table = self.get_table(schema)
         table.drop()
+        self.database.forget(schema["id"])
         
     def deploy_alter_add(self, schema):
         table = self.get_table(schema)
+        columns = []
         for name, prop in schema["properties"].items():
-            column = self.get_column(name, prop)
-            column.create(table)
+            columns.append(self.get_column(name, prop))
+        self.database.add_columns(table, columns)
             
     def deploy_alter_drop(self, schema):
         table = self.get_table(schema)
-        for name, prop in schema["properties"].items():
-            column = table.c[name]
-            column.drop()
+        self.database.drop_columns(table, list(schema["properties"].keys()))
             
     def deploy_alter_rename(self, schema):
         table = self.get_table(schema)
         for oldname, newname in schema["properties"].items():
             column = table.c[oldname]
-            column.alter(name=newname)
+            self.database.alter_column(column, name=newname)
+        # migrate does not rename the column in the cached table
+        self.database.forget(schema["id"])
             
     def deploy_alter_modify(self, schema):
         table = self.get_table(schema)
         for name, prop in schema["properties"].items():
-            newcolumn = get_column(name, prop)
+            newcolumn = self.get_column(name, prop)
             oldcolumn = table.c[name]
-            oldcolumn.alter(newcolumn)
+            self.database.alter_column(oldcolumn, newcolumn)
+        self.database.forget(schema["id"])
         
     def get_table(self, schema):
         return self.database.table(schema["id"])
         
     def get_column(self, name, prop):
-        return self.database.column(name, prop)
\ No newline at end of file
+        return self.database.column(name, prop)
+
+
+class DatabaseStorage(Storage):
+    """Storage backed by the _evolve(type, key, value) table.
+    
+    Objects are stored as canonical JSON. The first read loads every row 
+    with a single select and later reads are served from memory, the ids 
+    alone are read once to find what a push must write. Both caches last 
+    as long as the storage, which belongs to one DatabaseRepository.
+    """
+    properties = {
+        "type": {"type": "string", "maxLength": 40},
+        "key": {"type": "string", "maxLength": 40},
+        "value": {"type": "string"},
+    }
+    
+    def __init__(self, database):
+        self.database = database
+        self.objects = None
+        self.keys = None
+        self._table = None
+        
+    def table(self):
+        """Return the _evolve table, defined from properties rather than 
+        reflected"""
+        if self._table is None:
+            columns = [self.database.column(name, prop)
+                for name, prop in sorted(self.properties.items())]
+            self._table = Table('_evolve', MetaData(), *columns)
+        return self._table
+        
+    def execute(self, statement, *multiparams):
+        """Execute statement on the database's current bind, raises 
+        RepositoryNotFound when the _evolve table does not exist"""
+        try:
+            return self.database.metadata.bind.execute(statement, *multiparams)
+        except sqlalchemy.exc.DBAPIError:
+            self.database.forget('_evolve')
+            if not self.database.table('_evolve').columns:
+                raise RepositoryNotFound()
+            raise
+        
+    def load(self):
+        """Return {(type, key): object} of every row, read once"""
+        if self.objects is None:
+            table = self.table()
+            objects = {}
+            for _type, key, value in self.execute(
+                    select([table.c.type, table.c.key, table.c.value])):
+                objects[(_type, key)] = json.loads(value)
+            self.objects = objects
+            self.keys = set(objects)
+        return self.objects
+        
+    def known(self):
+        """Return the set of (type, key) stored"""
+        if self.keys is None:
+            table = self.table()
+            self.keys = set((_type, key) for _type, key in 
+                self.execute(select([table.c.type, table.c.key])))
+        return self.keys
+        
+    def get(self, _type, object_id):
+        return self.load()[(_type, object_id)]
+        
+    def read(self, _type, key):
+        """Return one stored object with a single query, bypassing the 
+        cache. Returns None when it is not stored."""
+        table = self.table()
+        value = self.execute(select([table.c.value]).where(and_(
+            table.c.type == hashing.to_text(_type),
+            table.c.key == hashing.to_text(key)))).scalar()
+        if value is None:
+            return None
+        return json.loads(value)
+        
+    def read_many(self, _type, keys):
+        """Return {key: object} of the stored keys of type, read with a 
+        single query bypassing the cache"""
+        if not keys:
+            return {}
+        table = self.table()
+        rows = self.execute(select([table.c.key, table.c.value]).where(and_(
+            table.c.type == hashing.to_text(_type),
+            table.c.key.in_([hashing.to_text(key) for key in keys]))))
+        return dict((key, json.loads(value)) for key, value in rows)
+        
+    def append(self, _type, key, data):
+        """Insert a row without checking what is stored"""
+        self.execute(self.table().insert(), [{
+            "type": hashing.to_text(_type),
+            "key": hashing.to_text(key),
+            "value": hashing.to_text(hashing.canonical_json(data))
+        }])
+        if self.keys is not None:
+            self.keys.add((_type, key))
+        if self.objects is not None:
+            self.objects[(_type, key)] = data
+            
+    def delete_many(self, _type, keys):
+        if not keys:
+            return
+        table = self.table()
+        self.execute(table.delete().where(and_(
+            table.c.type == hashing.to_text(_type),
+            table.c.key.in_([hashing.to_text(key) for key in keys]))))
+        for key in keys:
+            if self.keys is not None:
+                self.keys.discard((_type, key))
+            if self.objects is not None:
+                self.objects.pop((_type, key), None)
+        
+    def write(self, _type, key, data):
+        """Store data under type and key, replacing what is stored there"""
+        table = self.table()
+        value = hashing.to_text(hashing.canonical_json(data))
+        result = self.execute(table.update().where(and_(
+            table.c.type == hashing.to_text(_type),
+            table.c.key == hashing.to_text(key))).values(value=value))
+        if not result.rowcount:
+            self.execute(table.insert(), [{
+                "type": hashing.to_text(_type),
+                "key": hashing.to_text(key),
+                "value": value
+            }])
+        if self.keys is not None:
+            self.keys.add((_type, key))
+        if self.objects is not None:
+            self.objects[(_type, key)] = data
+        
+    def put(self, _type, object_id, data):
+        self.put_many([(_type, object_id, data)])
+        
+    def put_many(self, objects):
+        """Insert the (type, key, object) tuples not stored yet with one 
+        bulk insert. Returns the number of rows inserted."""
+        known = self.known()
+        rows = []
+        for _type, key, data in objects:
+            if (_type, key) in known:
+                continue
+            known.add((_type, key))
+            if self.objects is not None:
+                self.objects[(_type, key)] = data
+            rows.append({
+                "type": hashing.to_text(_type),
+                "key": hashing.to_text(key),
+                "value": hashing.to_text(hashing.canonical_json(data))
+            })
+        if rows:
+            self.execute(self.table().insert(), rows)
+        return len(rows)
+        
+    def contains(self, _type, object_id):
+        return (_type, object_id) in self.known()
+        
+    def ids(self, _type):
+        return set(key for stored_type, key in self.known() if stored_type == _type)
+        
+    def branches(self):
+        """Return {branch name: commit id}"""
+        return dict((key, value) for (_type, key), value in self.load().items()
+            if _type == 'branch')
+            
+    def set_branches(self, branches):
+        """Point the given branches at their commits"""
+        if not branches:
+            return
+        table = self.table()
+        names = list(branches.keys())
+        self.execute(table.delete().where(and_(
+            table.c.type == hashing.to_text('branch'),
+            table.c.key.in_([hashing.to_text(name) for name in names]))))
+        for name in names:
+            self.known().discard(('branch', name))
+        self.put_many([('branch', name, commit_id) 
+            for name, commit_id in branches.items()])
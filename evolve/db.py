@@ -1,18 +1,158 @@
 from sqlalchemy import *
+from sqlalchemy.engine.reflection import Inspector
 from migrate import *
-from evolve.json2sql import JSONSchemaTypeToSQLColumnType
+from migrate.changeset.schema import ColumnDelta
+from migrate.changeset.databases.visitor import get_engine_visitor
+from sqlalchemy import event
+from sqlalchemy.engine.base import Connection
+import sqlalchemy.exc
+from contextlib import contextmanager
+from evolve.json2sql import column_type
 
 
 class Database(object):
-    def __init__(self, dbstring):
+    # dialects that can roll back DDL as part of a transaction
+    transactional_ddl_dialects = ['postgresql', 'mssql']
+    # dialects that accept several ADD/DROP COLUMN clauses in one ALTER
+    multi_column_alter_dialects = ['postgresql', 'mysql']
+    
+    def __init__(self, dbstring, pool_size=None, engine=None):
         self.dbstring = dbstring
-        self.engine = create_engine(dbstring)
+        if engine is None:
+            engine = self.create_engine(dbstring, pool_size)
+        self.engine = engine
         self.metadata = MetaData(self.engine)
         
+    @staticmethod
+    def create_engine(dbstring, pool_size=None):
+        """Create the engine, its connection pool limited to pool_size 
+        connections when given. SQLite does not pool connections and 
+        ignores pool_size."""
+        if dbstring.startswith('sqlite'):
+            engine = create_engine(dbstring)
+            event.listen(engine, 'connect', sqlite_connect)
+            event.listen(engine, 'begin', sqlite_begin)
+            return engine
+        if pool_size is None:
+            return create_engine(dbstring)
+        return create_engine(dbstring, pool_size=pool_size, max_overflow=0)
+        
+    def worker(self):
+        """Return a Database sharing this engine, and so its connection 
+        pool, with metadata of its own. Workers can be bound to their own 
+        connections and used from separate threads."""
+        return Database(self.dbstring, engine=self.engine)
+        
+    @property
+    def dialect_name(self):
+        return self.engine.dialect.name
+        
+    @property
+    def transactional_ddl(self):
+        return self.dialect_name in self.transactional_ddl_dialects
+        
+    @contextmanager
+    def connect(self):
+        """Bind the metadata to a single connection for the duration of the 
+        block. On backends with transactional DDL everything issued in the 
+        block runs in one transaction."""
+        connection = self.engine.connect()
+        transaction = None
+        if self.transactional_ddl:
+            transaction = connection.begin()
+        self.metadata.bind = connection
+        try:
+            yield connection
+            if transaction:
+                transaction.commit()
+        except:
+            if transaction:
+                transaction.rollback()
+            raise
+        finally:
+            self.metadata.bind = self.engine
+            connection.close()
+        
+    @contextmanager
+    def transaction(self):
+        """Run the block in one transaction, on the bound connection or on a 
+        connection bound for the duration of the block. Nested in a 
+        transaction already begun, the block joins it."""
+        bind = self.metadata.bind
+        if not isinstance(bind, Connection):
+            connection = self.engine.connect()
+            self.metadata.bind = connection
+        else:
+            connection = bind
+        transaction = connection.begin()
+        try:
+            yield connection
+            transaction.commit()
+        except:
+            transaction.rollback()
+            raise
+        finally:
+            if connection is not bind:
+                self.metadata.bind = bind
+                connection.close()
+        
+    @contextmanager
+    def lock_table(self, table_name):
+        """Run the block in one transaction holding an exclusive lock on 
+        table_name, so no writes land in it until the block is done. MySQL 
+        commits before every DDL statement, there the lock is taken with 
+        LOCK TABLES and held until the end of the block instead."""
+        preparer = self.engine.dialect.identifier_preparer
+        name = preparer.quote_identifier(table_name)
+        with self.transaction() as connection:
+            if self.dialect_name == 'mysql':
+                connection.execute("LOCK TABLES %s WRITE" % name)
+                try:
+                    yield connection
+                finally:
+                    connection.execute("UNLOCK TABLES")
+                return
+            if self.dialect_name == 'postgresql':
+                connection.execute("LOCK TABLE %s IN ACCESS EXCLUSIVE MODE" % name)
+            yield connection
+            
     def table(self, table_name):
+        """Return table_name, reflected the first time it is asked for and 
+        cached in the metadata until forget(). A table that does not exist 
+        is returned, and cached, without columns."""
+        metadata = self.metadata
+        if table_name in metadata.tables:
+            return metadata.tables[table_name]
+        try:
+            return Table(table_name, metadata, autoload=True)
+        except sqlalchemy.exc.NoSuchTableError:
+            return Table(table_name, metadata)
+            
+    def prefetch(self, table_names):
+        """Cache every table of table_names at once. The existing tables are 
+        listed with a single inspector query and only those are reflected."""
         metadata = self.metadata
-        table = Table(table_name, metadata)
-        return table
+        table_names = [table_name for table_name in set(table_names)
+            if table_name not in metadata.tables]
+        if not table_names:
+            return
+        existing = set(Inspector.from_engine(metadata.bind).get_table_names())
+        reflected = [table_name for table_name in table_names 
+            if table_name in existing]
+        if reflected:
+            metadata.reflect(only=reflected)
+        for table_name in table_names:
+            if table_name not in existing:
+                Table(table_name, metadata)
+        
+    def forget(self, table_name):
+        """Drop the in-memory definition of table_name, it is reflected 
+        again when next asked for"""
+        if table_name in self.metadata.tables:
+            self.metadata.remove(self.metadata.tables[table_name])
+            
+    def forget_all(self):
+        self.metadata.clear()
 
     def column(self, name, prop):
         _type = self.column_type(prop)
@@ -25,4 +165,125 @@ class Database(object):
         return column
 
     def column_type(self, prop):
-        return JSONSchemaTypeToSQLColumnType(prop).get_column_type()
\ No newline at end of file
+        return column_type(prop)
+        
+    def add_columns(self, table, columns):
+        """Add columns to table, with a single ALTER where the dialect 
+        allows it."""
+        if len(columns) == 1 or self.dialect_name not in self.multi_column_alter_dialects:
+            for column in columns:
+                column.create(table, connection=self.metadata.bind)
+            return
+            
+        dialect = self.engine.dialect
+        preparer = dialect.identifier_preparer
+        clauses = []
+        for column in columns:
+            clauses.append("ADD COLUMN %s %s" % (
+                preparer.format_column(column), 
+                dialect.type_compiler.process(column.type)))
+            table.append_column(column)
+        self.alter_table(table, clauses)
+        
+    def drop_columns(self, table, names):
+        """Drop the named columns from table, with a single ALTER where the 
+        dialect allows it."""
+        if len(names) == 1 or self.dialect_name not in self.multi_column_alter_dialects:
+            for name in names:
+                table.c[name].drop(connection=self.metadata.bind)
+            return
+            
+        preparer = self.engine.dialect.identifier_preparer
+        clauses = []
+        for name in names:
+            clauses.append("DROP COLUMN %s" % preparer.quote_identifier(name))
+        self.alter_table(table, clauses)
+        self.forget(table.name)
+        
+    def alter_column(self, column, *args, **kwargs):
+        """column.alter(*args, **kwargs) over the bound connection.
+        
+        migrate alters columns over bind.connect(), which for a Connection 
+        is the connection itself, and closes it afterwards. The plan's 
+        connection has to stay open, so the delta is run here instead.
+        """
+        bind = self.metadata.bind
+        kwargs.setdefault('table', column.table)
+        kwargs.setdefault('engine', bind)
+        kwargs['alter_metadata'] = True
+        delta = ColumnDelta(column, *args, **kwargs)
+        visitor = get_engine_visitor(bind, 'schemachanger')
+        visitor(bind.dialect, bind).traverse_single(delta)
+        
+    def alter_table(self, table, clauses):
+        preparer = self.engine.dialect.identifier_preparer
+        statement = "ALTER TABLE %s %s" % (
+            preparer.format_table(table), ", ".join(clauses))
+        self.metadata.bind.execute(statement)
+        
+    def rebuild_table(self, table_name, changes):
+        """Apply alter changes to table_name by copying it into a new table.
+        
+        This is how SQLite alters anything but added columns, doing it once 
+        for a batch of changes avoids rewriting the table per column. The 
+        copy and swap run in one transaction, so a failure leaves the old 
+        table in place.
+        """
+        with self.transaction() as bind:
+            self.rebuild_table_in(bind, table_name, changes)
+        self.forget(table_name)
+        
+    def rebuild_table_in(self, bind, table_name, changes):
+        preparer = self.engine.dialect.identifier_preparer
+        metadata = MetaData(bind)
+        old_table = Table(table_name, metadata, autoload=True)
+        
+        # column name -> (source column name, column)
+        columns = []
+        for column in old_table.columns:
+            columns.append([column.name, column.name, column])
+        for change in changes:
+            action = change["change"]
+            for name, prop in change["schema"]["properties"].items():
+                if action == "alter.add":
+                    columns.append([name, None, self.column(name, prop)])
+                    continue
+                entry = [entry for entry in columns if entry[0] == name][0]
+                if action == "alter.drop":
+                    columns.remove(entry)
+                if action == "alter.rename":
+                    entry[0] = prop
+                if action == "alter.modify":
+                    column = self.column(name, prop)
+                    column.primary_key = column.primary_key or entry[2].primary_key
+                    entry[2] = column
+        
+        new_name = "_evolve_rebuild_%s" % table_name
+        new_columns = []
+        for name, source, column in columns:
+            new_columns.append(Column(name, column.type, 
+                primary_key=column.primary_key, nullable=column.nullable))
+        new_table = Table(new_name, metadata, *new_columns)
+        new_table.create()
+        
+        copied = [(name, source) for name, source, column in columns if source]
+        if copied:
+            bind.execute("INSERT INTO %s (%s) SELECT %s FROM %s" % (
+                preparer.quote_identifier(new_name),
+                ", ".join([preparer.quote_identifier(name) for name, source in copied]),
+                ", ".join([preparer.quote_identifier(source) for name, source in copied]),
+                preparer.quote_identifier(table_name)))
+        old_table.drop()
+        bind.execute("ALTER TABLE %s RENAME TO %s" % (
+            preparer.quote_identifier(new_name),
+            preparer.quote_identifier(table_name)))
+
+
+def sqlite_connect(dbapi_connection, connection_record):
+    # pysqlite commits before every DDL statement, let SQLAlchemy issue 
+    # BEGIN itself so DDL can be part of a transaction
+    dbapi_connection.isolation_level = None
+
+
+def sqlite_begin(connection):
+    connection.execute("BEGIN")
@@ -20,4 +20,12 @@ class CommitNotFound(Exception):
 
 
 class InvalidChange(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class TableNotFound(Exception):
+    pass
+
+
+class RepositoryNotFound(Exception):
+    pass
@@ -1,4 +1,7 @@
 from evolve.exceptions import RepositoryAlreadyExists
+from evolve.object_store import ObjectStore
+from evolve.repository import Repository
+from evolve.storage import Storage
 import os
 
 try:
@@ -18,6 +21,7 @@ class FileRepository(object):
             
         self.initialize_repository_file(directory)    
         self.initialize_changes_file(directory)
+        ObjectStore(directory).initialize()
         
     def is_repository(self, directory):
         repo_file = '%s/evolve.json' % directory
@@ -40,6 +44,102 @@ class FileRepository(object):
         changes_file = '%s/changes.json' % directory
         self.write_to_file(changes_data, changes_file)
         
+    def load(self, directory):
+        """Load the repository stored in directory. Commits, changes and 
+        snapshots are read from the object store when first needed.
+        
+        Returns Repository().
+        """
+        repo_data = self.read_from_file('%s/evolve.json' % directory)
+        # objects written before the object store existed
+        legacy = {
+            'commit': repo_data['commits'],
+            'change': repo_data['changes']
+        }
+        repository = Repository(storage=FileStorage(directory, legacy))
+        repository.branches.update(repo_data['branches'])
+        return repository
+        
+    def save(self, directory, repository):
+        """Write the objects of repository missing from the store in 
+        directory and update its branches."""
+        storage = repository.storage
+        if not (isinstance(storage, FileStorage) and storage.is_stored_in(directory)):
+            storage = FileStorage(directory)
+            storage.store.initialize()
+            objects = [
+                ('commit', repository.commits),
+                ('change', repository.changes),
+                ('snapshot', repository.snapshots)
+            ]
+            for _type, items in objects:
+                for object_id, data in items.items():
+                    if object_id != 'root':
+                        storage.put(_type, object_id, data)
+        # else the objects were written through as they were added
+                
+        repo_file = '%s/evolve.json' % directory
+        repo_data = self.read_from_file(repo_file)
+        repo_data['branches'] = dict(repository.branches)
+        self.write_to_file(repo_data, repo_file)
+        
+    def pack(self, directory):
+        """Move the loose objects of the repository in directory into its 
+        pack. Returns the number of objects packed."""
+        return ObjectStore(directory).pack()
+        
+    def read_from_file(self, filename):
+        f = open(filename, 'r')
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+        
     def write_to_file(self, data, filename):
         f = open(filename, 'w')
-        json.dump(data, f, indent=4)
\ No newline at end of file
+        try:
+            json.dump(data, f, indent=4)
+        finally:
+            f.close()
+
+
+class FileStorage(Storage):
+    """Storage backed by the object store of a file repository"""
+    def __init__(self, directory, legacy=None):
+        self.directory = directory
+        self.store = ObjectStore(directory)
+        self.legacy = legacy or {}
+        
+    def is_stored_in(self, directory):
+        return os.path.abspath(directory) == os.path.abspath(self.directory)
+        
+    def object_id(self, _type, object_id):
+        if _type == 'snapshot':
+            # snapshots are keyed by the id of their commit
+            return '%s.snapshot' % object_id
+        return object_id
+        
+    def get(self, _type, object_id):
+        try:
+            stored_type, data = self.store.get(self.object_id(_type, object_id))
+        except KeyError:
+            return self.legacy.get(_type, {})[object_id]
+        if stored_type != _type:
+            raise KeyError(object_id)
+        return data
+        
+    def put(self, _type, object_id, data):
+        self.store.put(self.object_id(_type, object_id), _type, data)
+        
+    def contains(self, _type, object_id):
+        if self.object_id(_type, object_id) in self.store:
+            return True
+        return object_id in self.legacy.get(_type, {})
+        
+    def ids(self, _type):
+        ids = set(self.legacy.get(_type, {}).keys())
+        for object_id in self.store.ids(_type):
+            if _type == 'snapshot':
+                object_id = object_id[:-len('.snapshot')]
+            ids.add(object_id)
+        return ids
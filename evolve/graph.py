@@ -0,0 +1,94 @@
+class CommitGraph(object):
+    """Index of the commit history.
+
+    Keeps the parent pointer and depth of every indexed commit, plus skip
+    pointers to its 2**k-th ancestors so ancestor and common ancestor
+    queries take O(log depth) steps.
+    """
+    def __init__(self):
+        self.parents = {}
+        self.depths = {}
+        self.jumps = {}
+
+    def __contains__(self, commit_id):
+        return commit_id in self.depths
+
+    def __len__(self):
+        return len(self.depths)
+
+    def add(self, commit_id, parent_id=None):
+        """Index commit_id, its parent must already be indexed"""
+        if parent_id is None:
+            self.parents[commit_id] = None
+            self.depths[commit_id] = 0
+            self.jumps[commit_id] = []
+            return
+
+        jumps = [parent_id]
+        while True:
+            ancestor_jumps = self.jumps[jumps[-1]]
+            level = len(jumps) - 1
+            if level >= len(ancestor_jumps):
+                break
+            jumps.append(ancestor_jumps[level])
+
+        self.parents[commit_id] = parent_id
+        self.depths[commit_id] = self.depths[parent_id] + 1
+        self.jumps[commit_id] = jumps
+
+    def parent(self, commit_id):
+        return self.parents[commit_id]
+
+    def depth(self, commit_id):
+        return self.depths[commit_id]
+
+    def ancestor_at_depth(self, commit_id, depth):
+        """Return the ancestor of commit_id found at the given depth"""
+        distance = self.depths[commit_id] - depth
+        if distance < 0:
+            return None
+        level = 0
+        while distance:
+            if distance & 1:
+                commit_id = self.jumps[commit_id][level]
+            distance >>= 1
+            level += 1
+        return commit_id
+
+    def is_ancestor(self, ancestor_id, commit_id):
+        """True if ancestor_id is commit_id or one of its ancestors"""
+        depth = self.depths[ancestor_id]
+        return self.ancestor_at_depth(commit_id, depth) == ancestor_id
+
+    def lowest_common_ancestor(self, one, two):
+        """Return the deepest commit that is an ancestor of both commits,
+        or None if they do not share a root."""
+        depth = min(self.depths[one], self.depths[two])
+        one = self.ancestor_at_depth(one, depth)
+        two = self.ancestor_at_depth(two, depth)
+        if one == two:
+            return one
+
+        level = len(self.jumps[one]) - 1
+        while level >= 0:
+            jumps_one = self.jumps[one]
+            jumps_two = self.jumps[two]
+            if level < len(jumps_one) and jumps_one[level] != jumps_two[level]:
+                one = jumps_one[level]
+                two = jumps_two[level]
+            level -= 1
+
+        one = self.parents[one]
+        two = self.parents[two]
+        if one is None or one != two:
+            return None
+        return one
+
+    def ancestors(self, commit_id):
+        """Return the ids from the root down to commit_id"""
+        ancestors = []
+        while commit_id is not None:
+            ancestors.append(commit_id)
+            commit_id = self.parents[commit_id]
+        ancestors.reverse()
+        return ancestors
@@ -0,0 +1,53 @@
+"""Content hashes for change and commit ids.
+
+Changes are hashed over their canonical JSON form: sorted keys, compact
+separators, UTF-8 bytes. The same change therefore gets the same id in
+every process and on every Python version.
+
+Commit ids are Merkle hashes over the parent id, the change ids of the
+changelog and the message, so a commit is hashed without serializing the
+changes again.
+"""
+import hashlib
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+
+def canonical_json(obj):
+    """Return the canonical JSON serialization of obj as bytes"""
+    serialized = encoder.encode(obj)
+    if not isinstance(serialized, bytes):
+        serialized = serialized.encode('utf-8')
+    return serialized
+
+
+def to_bytes(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+
+def to_text(data):
+    if isinstance(data, bytes):
+        return data.decode('utf-8')
+    return data
+
+
+def change_id(change):
+    return hashlib.sha1(canonical_json(change)).hexdigest()
+
+
+def commit_id(parent_id, change_ids, msg):
+    digest = hashlib.sha1()
+    if parent_id:
+        digest.update(b'parent ' + to_bytes(parent_id) + b'\n')
+    for change_id in change_ids:
+        digest.update(b'change ' + to_bytes(change_id) + b'\n')
+    digest.update(b'msg ' + canonical_json(msg))
+    return digest.hexdigest()
@@ -0,0 +1,170 @@
+"""Timing hooks around repository, schema and deploy operations.
+
+Instrumented operations run inside span(name). When at least one callback
+is subscribed, every span emits a 'start' and an 'end' event to the
+callbacks; with no subscribers span() returns a shared no-op span.
+"""
+import os
+import threading
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+subscribers = []
+
+
+def subscribe(callback):
+    """Call callback(event) for every span event"""
+    subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    if callback in subscribers:
+        subscribers.remove(callback)
+
+
+def emit(event):
+    for callback in list(subscribers):
+        callback(event)
+
+
+class Span(object):
+    """Time an operation and count what it touched.
+
+    Events are dicts with the span name, its phase ('start' or 'end'),
+    the start time, the thread id, the counts and, for 'end', the duration
+    in seconds.
+    """
+    def __init__(self, name, counts):
+        self.name = name
+        self.counts = counts
+        self.start = None
+
+    def count(self, key, amount=1):
+        self.counts[key] = self.counts.get(key, 0) + amount
+
+    def event(self, phase):
+        return {
+            'name': self.name,
+            'phase': phase,
+            'start': self.start,
+            'thread': threading.current_thread().ident,
+            'counts': self.counts
+        }
+
+    def __enter__(self):
+        self.start = time.time()
+        emit(self.event('start'))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event = self.event('end')
+        event['duration'] = time.time() - self.start
+        event['error'] = exc_type is not None
+        emit(event)
+        return False
+
+
+class NullSpan(object):
+    """Span used when nothing is subscribed"""
+    def count(self, key, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+null_span = NullSpan()
+
+
+def span(name, **counts):
+    if not subscribers:
+        return null_span
+    return Span(name, counts)
+
+
+class Collector(object):
+    """Subscriber aggregating the timings of every finished span"""
+    def __init__(self):
+        self.stats = {}
+        self.events = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        subscribe(self)
+        return self
+
+    def stop(self):
+        unsubscribe(self)
+
+    def __call__(self, event):
+        if event['phase'] != 'end':
+            return
+        with self.lock:
+            self.record(event)
+            
+    def record(self, event):
+        self.events.append(event)
+        stats = self.stats.get(event['name'])
+        if stats is None:
+            stats = self.stats[event['name']] = {
+                'calls': 0,
+                'total': 0.0,
+                'min': None,
+                'max': 0.0,
+                'counts': {}
+            }
+        duration = event['duration']
+        stats['calls'] += 1
+        stats['total'] += duration
+        if stats['min'] is None or duration < stats['min']:
+            stats['min'] = duration
+        stats['max'] = max(stats['max'], duration)
+        for key, amount in event['counts'].items():
+            if isinstance(amount, (int, float)):
+                stats['counts'][key] = stats['counts'].get(key, 0) + amount
+
+    def report(self):
+        """Return the aggregated timings as text, slowest total first"""
+        lines = ["%-36s %8s %12s %12s %12s  %s" % (
+            "operation", "calls", "total ms", "mean ms", "max ms", "counts")]
+        ordered = sorted(self.stats.items(),
+            key=lambda item: item[1]['total'], reverse=True)
+        for name, stats in ordered:
+            counts = ", ".join(["%s=%s" % item
+                for item in sorted(stats['counts'].items())])
+            lines.append("%-36s %8d %12.3f %12.3f %12.3f  %s" % (
+                name, stats['calls'], stats['total'] * 1000,
+                stats['total'] * 1000 / stats['calls'], stats['max'] * 1000,
+                counts))
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """Return the collected spans in the Chrome trace event format"""
+        pid = os.getpid()
+        trace_events = []
+        for event in self.events:
+            trace_events.append({
+                'name': event['name'],
+                'ph': 'X',
+                'ts': event['start'] * 1000000,
+                'dur': event['duration'] * 1000000,
+                'pid': pid,
+                'tid': event['thread'],
+                'args': event['counts']
+            })
+        return {'traceEvents': trace_events}
+
+    def write_chrome_trace(self, filename):
+        f = open(filename, 'w')
+        try:
+            json.dump(self.chrome_trace(), f)
+        finally:
+            f.close()
@@ -0,0 +1,73 @@
+from evolve.hashing import canonical_json
+import copy
+import hashlib
+
+
+class FrozenDict(dict):
+    """dict that can't be modified.
+
+    Copies are plain dicts, so code that copies a change before changing
+    it keeps working.
+    """
+    def immutable(self, *args, **kwargs):
+        raise TypeError("Interned objects can not be modified")
+
+    __setitem__ = immutable
+    __delitem__ = immutable
+    clear = immutable
+    pop = immutable
+    popitem = immutable
+    setdefault = immutable
+    update = immutable
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self), ))
+
+
+class Interner(object):
+    """Share one immutable instance between equal changes and between the
+    equal parts of different changes, e.g. the same property definition
+    or table schema committed on several branches."""
+    def __init__(self):
+        self.objects = {}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def intern(self, obj):
+        """Return the shared, frozen equivalent of obj"""
+        return self.intern_keyed(obj)[0]
+
+    def intern_keyed(self, obj):
+        """Return the frozen equivalent of obj and its key.
+
+        Keys are fixed size digests built from the keys of the children,
+        so every value is serialized once whatever its depth.
+        """
+        if isinstance(obj, dict):
+            digest = hashlib.sha1(b'{')
+            items = []
+            for key in sorted(obj):
+                value, value_key = self.intern_keyed(obj[key])
+                items.append((key, value))
+                digest.update(canonical_json(key))
+                digest.update(value_key)
+            key = digest.digest()
+            if key not in self.objects:
+                self.objects[key] = FrozenDict(items)
+            return self.objects[key], key
+        if isinstance(obj, list):
+            digest = hashlib.sha1(b'[')
+            values = []
+            for value in obj:
+                value, value_key = self.intern_keyed(value)
+                values.append(value)
+                digest.update(value_key)
+            return values, digest.digest()
+        return obj, hashlib.sha1(canonical_json(obj)).digest()
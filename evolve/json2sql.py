@@ -2,54 +2,76 @@ from sqlalchemy import *
 from migrate import *
 
 
+# SQL column type of each JSON schema type, strings are mapped by
+# string_type()
+types = {
+    "number": Float,
+    "integer": Integer,
+    "boolean": Boolean,
+    # objects and arrays are stored as JSON text
+    "object": UnicodeText,
+    "array": UnicodeText
+}
+
+string_formats = {
+    "date": Date,
+    "date-time": DateTime,
+    "time": Time
+}
+
+# property signature -> column type, see column_type()
+column_types = {}
+
+
+def signature(prop):
+    """Return the parts of prop that decide its column type, as a tuple.
+
+    Properties with the same signature share one column type instance.
+    """
+    # prop must contain "type"
+    _type = prop["type"]
+    if _type != "string":
+        return (_type, None, None)
+    _format = prop.get("format")
+    if _format in string_formats:
+        return (_type, _format, None)
+    return (_type, None, prop.get("maxLength") or None)
+
+
+def column_type(prop):
+    """Return the column type of a property, raises ValueError for types
+    that are not JSON schema types"""
+    key = signature(prop)
+    try:
+        return column_types[key]
+    except KeyError:
+        pass
+    _type, _format, max_length = key
+    if _type == "string":
+        column_types[key] = string_type(_format, max_length)
+    elif _type in types:
+        column_types[key] = types[_type]()
+    else:
+        raise ValueError(_type)
+    return column_types[key]
+
+
+def string_type(_format, max_length):
+    if _format:
+        return string_formats[_format]()
+    if max_length:
+        return Unicode(length=max_length)
+    return UnicodeText()
+
+
 class JSONSchemaTypeToSQLColumnType(object):
-    allowed_types = [
-        "string", 
-        "number", 
-        "integer", 
-        "boolean", 
-        "object", 
-        "array"
-        ]
-    
+    allowed_types = ["string"] + sorted(types)
+
     def __init__(self, prop=None):
         self.prop = prop
-        
+
     def set_prop(self, prop):
         self.prop = prop
-        
+
     def get_column_type(self):
-        # prop must contain "type"
-        _type = self.prop["type"]
-        if _type not in self.allowed_types:
-            raise ValueError
-        if hasattr(self, _type):
-            _type_func = getattr(self, _type)
-            column_type = _type_func()
-        else:
-            raise NotImplementedError
-        return column_type
-            
-    def string(self):
-        if "format" in self.prop:
-            return self.string_with_format()
-        else:
-            return self.string_without_format()
-    
-    def string_with_format(self):
-        prop = self.prop
-        if prop["format"] == "date":
-            return self.string_with_format_date()
-        else:
-            # unrecognized format, ignore it
-            return self.string_without_format()
-            
-    def string_with_format_date(self):
-        pass
-        
-    def string_without_format(self):
-        prop = self.prop
-        if "maxLength" in prop and prop["maxLength"]:
-            return Unicode(length = prop["maxLength"])
-        else:
-            return UnicodeText()
\ No newline at end of file
+        return column_type(self.prop)
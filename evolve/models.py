@@ -1,23 +1,101 @@
+from sqlalchemy import MetaData, Table
 from sqlalchemy.orm import mapper
 from evolve.db import Database
+from evolve import hashing
+import hashlib
 
 
 class EvolvedModel(object):
     pass
 
 
+# models built in this process, schema key -> {model name: model}
+schema_models = {}
+# table fingerprint -> model
+table_models = {}
+
+
+def fingerprint(obj):
+    return hashlib.sha1(hashing.canonical_json(obj)).hexdigest()
+
+
+def changed_tables(changes):
+    """Return the names of the tables touched by a list of changes"""
+    return set([change["schema"]["id"] for change in changes])
+
+
 class Models(object):
-    def __init__(self, dbstring, schema):
+    """ORM models of a schema, {table name: table schema}.
+
+    Tables are generated from the schema, so building models does not
+    reflect the database. Models are memoized in the process by key, a
+    commit id or by default the fingerprint of the schema, and tables by
+    their own fingerprint, so building the same schema again maps nothing.
+    """
+    def __init__(self, dbstring, schema, key=None):
         self.database = Database(dbstring)
         self.schema = schema
+        self.key = key
+        self.commit_id = None
         self.models = {}
-        
+
     def build(self):
         """Build models from schema"""
+        if self.key is None:
+            self.key = fingerprint(self.schema)
+        if self.key in schema_models:
+            self.models = dict(schema_models[self.key])
+            return
         for modelname, modelschema in self.schema.items():
-            table_name = modelschema["id"]
-            table = self.database.table(table_name)
+            self.models[modelname] = self.model(modelname, modelschema)
+        schema_models[self.key] = dict(self.models)
+
+    def rebuild(self, schema, key=None, changed=None):
+        """Switch to schema. Only tables whose definition changed get a new
+        model, changed optionally names the tables known to differ."""
+        models = {}
+        for modelname, modelschema in schema.items():
+            if (changed is not None and modelname not in changed and
+                    modelname in self.models):
+                models[modelname] = self.models[modelname]
+            else:
+                models[modelname] = self.model(modelname, modelschema)
+        self.schema = schema
+        self.key = key or fingerprint(schema)
+        self.models = models
+        schema_models[self.key] = dict(models)
+
+    def checkout(self, repository, commit_id):
+        """Build the models of a commit. When the models were built for
+        another commit, only the tables changed by the migration between
+        the two commits are remapped."""
+        schema = repository.checkout_commit(commit_id).schema.tables
+        if self.commit_id is None:
+            self.schema = schema
+            self.key = commit_id
+            self.models = {}
+            self.build()
+        elif self.commit_id != commit_id:
+            changed = changed_tables(repository.migrate(self.commit_id, commit_id))
+            self.rebuild(schema, commit_id, changed)
+        self.commit_id = commit_id
+
+    def model(self, modelname, modelschema):
+        key = fingerprint([modelname, modelschema])
+        if key not in table_models:
+            table = self.table(modelschema)
             dct = {"schema": modelschema}
-            model = type(modelname, (EvolvedModel, ), dct)
-            mapper(model, table)
-            self.models[modelname] = model
\ No newline at end of file
+            model = type(str(modelname), (EvolvedModel, ), dct)
+            primary_key = None
+            if not table.primary_key.columns:
+                # a mapper needs a key, rows are identified by every column
+                primary_key = list(table.columns)
+            mapper(model, table, primary_key=primary_key)
+            table_models[key] = model
+        return table_models[key]
+
+    def table(self, modelschema):
+        """Return the Table of a table schema, without reflection"""
+        columns = [self.database.column(name, prop)
+            for name, prop in sorted(modelschema["properties"].items())]
+        return Table(modelschema["id"], MetaData(), *columns)
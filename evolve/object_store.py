@@ -0,0 +1,197 @@
+from evolve.hashing import canonical_json
+import os
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class ObjectStore(object):
+    """Content addressed store for commits, changes and snapshots.
+
+    New objects are written as loose files under objects/, one per object,
+    so adding an object never rewrites existing data. pack() moves the
+    loose objects to the end of an append-only pack log and records their
+    offsets in an index, which is loaded once and gives O(1) lookups.
+    The types of loose objects are appended to a small index of their own,
+    so listing the objects of a type reads no object.
+    """
+    def __init__(self, directory):
+        self.directory = os.path.join(directory, 'objects')
+        self.pack_file = os.path.join(self.directory, 'pack')
+        self.index_file = os.path.join(self.directory, 'pack.idx')
+        self.loose_index_file = os.path.join(self.directory, 'loose.idx')
+        self.index = None
+        self.loose_types = None
+
+    def initialize(self):
+        if not os.path.exists(self.directory):
+            os.mkdir(self.directory)
+
+    def loose_path(self, object_id):
+        return os.path.join(self.directory, object_id[:2], object_id[2:])
+
+    def load_index(self):
+        """Read the pack index, object id -> (type, offset, length)"""
+        if self.index is None:
+            self.index = {}
+            if os.path.exists(self.index_file):
+                f = open(self.index_file, 'r')
+                try:
+                    for line in f:
+                        object_id, _type, offset, length = line.split()
+                        self.index[object_id] = (_type, int(offset), int(length))
+                finally:
+                    f.close()
+        return self.index
+
+    def load_loose_types(self):
+        """Read the loose object index, object id -> type"""
+        if self.loose_types is None:
+            self.loose_types = {}
+            if os.path.exists(self.loose_index_file):
+                f = open(self.loose_index_file, 'r')
+                try:
+                    for line in f:
+                        object_id, _type = line.split()
+                        self.loose_types[object_id] = _type
+                finally:
+                    f.close()
+        return self.loose_types
+
+    def __contains__(self, object_id):
+        return (object_id in self.load_index() or
+            os.path.exists(self.loose_path(object_id)))
+
+    def get(self, object_id):
+        """Return (type, data) for object_id, raises KeyError"""
+        index = self.load_index()
+        if object_id in index:
+            _type, offset, length = index[object_id]
+            f = open(self.pack_file, 'rb')
+            try:
+                f.seek(offset)
+                record = f.read(length)
+            finally:
+                f.close()
+        else:
+            path = self.loose_path(object_id)
+            if not os.path.exists(path):
+                raise KeyError(object_id)
+            f = open(path, 'rb')
+            try:
+                record = f.read()
+            finally:
+                f.close()
+        obj = json.loads(record.decode('utf-8'))
+        return obj['type'], obj['data']
+
+    def put(self, object_id, _type, data):
+        """Store data under object_id unless it is already present"""
+        if object_id in self:
+            return False
+        path = self.loose_path(object_id)
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        tmp_path = '%s.tmp' % path
+        f = open(tmp_path, 'wb')
+        try:
+            f.write(self.serialize(object_id, _type, data))
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+        f = open(self.loose_index_file, 'a')
+        try:
+            f.write('%s %s\n' % (object_id, _type))
+        finally:
+            f.close()
+        if self.loose_types is not None:
+            self.loose_types[object_id] = _type
+        return True
+
+    def serialize(self, object_id, _type, data):
+        return canonical_json({'id': object_id, 'type': _type, 'data': data})
+
+    def loose_ids(self):
+        ids = []
+        for prefix in os.listdir(self.directory):
+            path = os.path.join(self.directory, prefix)
+            if not os.path.isdir(path):
+                continue
+            for rest in os.listdir(path):
+                if not rest.endswith('.tmp'):
+                    ids.append(prefix + rest)
+        return ids
+
+    def ids(self, _type=None):
+        """Return the ids of every stored object, or of every object of 
+        the given type"""
+        ids = set()
+        for object_id, entry in self.load_index().items():
+            if _type is None or entry[0] == _type:
+                ids.add(object_id)
+        loose_types = self.load_loose_types()
+        for object_id in self.loose_ids():
+            if _type is None:
+                ids.add(object_id)
+                continue
+            # objects written before the loose index are read for their type
+            stored_type = loose_types.get(object_id)
+            if stored_type is None:
+                stored_type = self.get(object_id)[0]
+            if stored_type == _type:
+                ids.add(object_id)
+        return ids
+
+    def pack(self):
+        """Append the loose objects to the pack and remove them.
+
+        Returns the number of objects packed.
+        """
+        index = self.load_index()
+        loose_ids = [object_id for object_id in self.loose_ids()
+            if object_id not in index]
+        if not loose_ids:
+            return 0
+
+        pack = open(self.pack_file, 'ab')
+        index_lines = []
+        try:
+            pack.seek(0, os.SEEK_END)
+            offset = pack.tell()
+            for object_id in loose_ids:
+                f = open(self.loose_path(object_id), 'rb')
+                try:
+                    record = f.read()
+                finally:
+                    f.close()
+                _type = json.loads(record.decode('utf-8'))['type']
+                pack.write(record + b'\n')
+                index_lines.append('%s %s %d %d\n' % (object_id, _type, offset, len(record)))
+                index[object_id] = (_type, offset, len(record))
+                offset += len(record) + 1
+            pack.flush()
+            os.fsync(pack.fileno())
+        finally:
+            pack.close()
+
+        f = open(self.index_file, 'a')
+        try:
+            f.write(''.join(index_lines))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+
+        for object_id in loose_ids:
+            path = self.loose_path(object_id)
+            os.remove(path)
+            directory = os.path.dirname(path)
+            if not os.listdir(directory):
+                os.rmdir(directory)
+        if os.path.exists(self.loose_index_file):
+            os.remove(self.loose_index_file)
+        self.loose_types = {}
+        return len(loose_ids)
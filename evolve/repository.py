@@ -1,24 +1,46 @@
 from evolve.commit import Commit
 from evolve.schema import Schema
+from evolve.snapshot import SnapshotCache
+from evolve.graph import CommitGraph
+from evolve.compact import MigrationCompactor
+from evolve.storage import ObjectMap
+from evolve.validator import RecordValidator
+from evolve.instrumentation import span
+from evolve import hashing
+from evolve.intern import Interner
 from evolve.exceptions import BranchNotFound
 from evolve.exceptions import BranchAlreadyExists
 from evolve.exceptions import NoCommonParent
 from evolve.exceptions import CommitNotFound
+from evolve.exceptions import InvalidChange
+from evolve.exceptions import TableNotFound
 import copy
 import hashlib
-
-try:
-    import json
-except ImportError:
-    import simplejson as json
+import itertools
 
 
 class Repository(object):
-    def __init__(self):
-        self.commits = {'root': {'changelog': [], 'msg': 'root'}}
+    def __init__(self, cache_size=32, snapshot_interval=100, storage=None):
+        root = {'root': {'changelog': [], 'msg': 'root'}}
+        # changes are immutable and share their equal parts
+        self.interner = Interner()
+        self.storage = storage
+        if storage:
+            # objects are fetched from the storage as they are needed
+            self.commits = ObjectMap(storage, 'commit', root)
+            self.changes = ObjectMap(storage, 'change', load=self.interner.intern)
+            self.snapshots = ObjectMap(storage, 'snapshot')
+        else:
+            self.commits = root
+            self.changes = {}
+            # persisted schema snapshots, taken every snapshot_interval commits
+            self.snapshots = {}
         self.branches = {}
         self.checkouts = {}
-        self.changes = {}
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_cache = SnapshotCache(cache_size)
+        self.graph = CommitGraph()
+        self.validators = {}
         
     def branch(self, branch_name, parent_branch_name=None):
         """Create a new branch.
@@ -46,122 +68,263 @@ class Repository(object):
         return self.checkout_commit(commit_id)
         
     def checkout_commit(self, commit_id):
-        commit = Commit()
+        with span('Repository.checkout_commit'):
+            commit = self.load_commit(commit_id)
+            commit.schema = self.materialize_schema(commit_id)
+        return commit
+        
+    def load_commit(self, commit_id):
+        """Return the Commit() for commit_id, its parent and schema are 
+        loaded when first accessed."""
+        return self.build_commit(commit_id, self.get_commit_dict(commit_id))
         
+    def get_commit_dict(self, commit_id):
         try:
-            commit_dict = self.commits[commit_id]
+            return self.commits[commit_id]
         except KeyError:
             raise CommitNotFound("Could not find the commit %s" % commit_id)
-        
+            
+    def build_commit(self, commit_id, commit_dict):
+        commit = Commit()
         commit.commit_id = commit_id
         commit.msg = commit_dict['msg']
         commit.changelog = commit_dict['changelog']
+        commit.parent_id = commit_dict.get('parent')
+        commit.parent_loader = self.load_commit
+        commit.schema_loader = self.materialize_schema
+        return commit
         
-        if 'parent' in commit_dict:
-            commit.parent = self.checkout_commit(commit_dict['parent'])
-            commit.schema = copy.deepcopy(commit.parent.schema)
-        else:
-            commit.parent = None
-            commit.schema = Schema()
+    def materialize_schema(self, commit_id):
+        """Build the schema at commit_id.
+        
+        Starts from the nearest cached or persisted snapshot and replays 
+        the changelogs of the commits between that snapshot and commit_id.
+        """
+        with span('Repository.materialize_schema') as timing:
+            tail = []
+            current = commit_id
+            while True:
+                tables = self.find_snapshot(current)
+                if tables is not None:
+                    break
+                commit_dict = self.get_commit_dict(current)
+                tail.append(commit_dict)
+                if 'parent' not in commit_dict:
+                    tables = {}
+                    break
+                current = commit_dict['parent']
+            
+            schema = Schema()
+            schema.tables = dict(tables)
+            for commit_dict in reversed(tail):
+                for change_id in commit_dict['changelog']:
+                    schema.add(self.changes[change_id])
+                timing.count('changes', len(commit_dict['changelog']))
+            timing.count('commits', len(tail))
+            
+            if tail:
+                self.snapshot_cache.put(commit_id, dict(schema.tables))
+        return schema
         
-        for change_id in commit.changelog:
-            change = self.changes[change_id]
-            commit.schema.add(change)
+    def find_snapshot(self, commit_id):
+        tables = self.snapshot_cache.get(commit_id)
+        if tables is None:
+            tables = self.snapshots.get(commit_id)
+        return tables
         
-        return commit
+    def index_commit(self, commit_id):
+        """Add commit_id and any of its ancestors missing from the commit 
+        graph."""
+        unindexed = []
+        current = commit_id
+        while current is not None and current not in self.graph:
+            commit_dict = self.get_commit_dict(current)
+            unindexed.append((current, commit_dict.get('parent')))
+            current = commit_dict.get('parent')
+        for current, parent_id in reversed(unindexed):
+            self.graph.add(current, parent_id)
+            
+    def get_depth(self, commit_id):
+        """Number of commits between commit_id and the root commit.
+        
+        Commits record their depth, only commits made before that are 
+        indexed in the commit graph, walking their ancestors.
+        """
+        if commit_id not in self.graph:
+            commit_dict = self.get_commit_dict(commit_id)
+            if 'depth' in commit_dict:
+                return commit_dict['depth']
+            if 'parent' not in commit_dict:
+                return 0
+        self.index_commit(commit_id)
+        return self.graph.depth(commit_id)
         
     def commit(self, branch_name, changes, msg):
         """Commit the given changes to the given branch_name"""
-        old_commit = self.checkout_branch(branch_name)
-        for change in changes:
-            old_commit.schema.verify(change)
-        
-        new_commit = Commit()
-        new_commit.msg = msg
-        new_commit.parent = old_commit
-        new_commit.schema = copy.deepcopy(old_commit.schema)
-        for change in changes:
-            change = new_commit.schema.make_change_reversible(change)
-            change_id = hashlib.sha1(json.dumps(change)).hexdigest()
-            self.changes[change_id] = change
-            new_commit.schema.add(change)
-            new_commit.changelog.append(change_id)
+        with span('Repository.commit', changes=len(changes)) as timing:
+            old_commit = self.checkout_branch(branch_name)
+            violations = old_commit.schema.verify_batch(changes)
+            if violations:
+                messages = [violation['message'] for violation in violations]
+                raise InvalidChange("Invalid changes: %s" % "; ".join(messages))
             
-        new_commit_dict = new_commit.to_dict()
-        new_commit_id = hashlib.sha1(json.dumps(new_commit_dict)).hexdigest()
-        self.commits[new_commit_id] = new_commit_dict
-        self.branches[branch_name] = new_commit_id
+            new_commit = Commit()
+            new_commit.msg = msg
+            new_commit.parent = old_commit
+            new_commit.schema = old_commit.schema.copy()
+            for change in changes:
+                change = new_commit.schema.make_change_reversible(change)
+                serialized = hashing.canonical_json(change)
+                timing.count('bytes', len(serialized))
+                change_id = hashlib.sha1(serialized).hexdigest()
+                if change_id in self.changes:
+                    change = self.changes[change_id]
+                else:
+                    change = self.interner.intern(change)
+                    self.changes[change_id] = change
+                new_commit.schema.add(change)
+                new_commit.changelog.append(change_id)
+                
+            depth = self.get_depth(old_commit.commit_id) + 1
+            new_commit_dict = new_commit.to_dict()
+            new_commit_dict['depth'] = depth
+            new_commit_id = hashing.commit_id(new_commit.parent_id, 
+                new_commit.changelog, msg)
+            self.commits[new_commit_id] = new_commit_dict
+            self.branches[branch_name] = new_commit_id
+            
+            # the new head is what the next commit to this branch will check out
+            self.snapshot_cache.put(new_commit_id, new_commit.schema.tables)
+            if self.snapshot_interval and depth % self.snapshot_interval == 0:
+                self.snapshots[new_commit_id] = dict(new_commit.schema.tables)
+        
+    def record_validator(self, commit_id, table):
+        """Return the RecordValidator for table as of commit_id.
+        
+        Validators are compiled once per commit and table.
+        """
+        key = (commit_id, table)
+        if key not in self.validators:
+            schema = self.materialize_schema(commit_id)
+            if table not in schema.tables:
+                raise TableNotFound("Could not find the table %s in commit %s" % (table, commit_id))
+            self.validators[key] = RecordValidator(schema.tables[table])
+        return self.validators[key]
         
     def find_common_parent(self, commit_one, commit_two):
         """Find the common parent between the two commits if one exists"""
-        one = self.checkout_commit(commit_one)
-        two = self.checkout_commit(commit_two)
-        listone = one.get_ancestors()
-        listtwo = two.get_ancestors()
-        def compare(a, b):
-            common = None
-            for index in range(len(a)):
-                if a[index] is not b[index]:
-                    return common
-                common = a[index]
-            return common
-                
-        if len(listone) < len(listtwo):
-            common = compare(listone, listtwo)
-        else:
-            common = compare(listtwo, listone)
-        
-        if not common:
+        self.index_commit(commit_one)
+        self.index_commit(commit_two)
+        common = self.graph.lowest_common_ancestor(commit_one, commit_two)
+        if common is None:
             raise NoCommonParent("The commits %s and %s do not share a common parent" % (commit_one, commit_two))
             
         return common
         
-    def migrate(self, source, target):
-        """Migrate from one commit to another"""
+    def migrate(self, source, target, compact=False):
+        """Migrate from one commit to another.
+        
+        With compact, redundant changes are collapsed, see 
+        MigrationCompactor.
+        """
+        with span('Repository.migrate') as timing:
+            changes = list(self.iter_migrate(source, target))
+            timing.count('changes', len(changes))
+            if compact:
+                changes = MigrationCompactor().compact(changes)
+                timing.count('compacted_changes', len(changes))
+        return changes
+        
+    def diff(self, source, target):
+        """Return the net changes from source to target.
+        
+        The changes are read from the changelogs along the path through 
+        the common parent and compacted per table as they stream by, 
+        neither schema is materialized. The result can be deployed like 
+        a migration, see compact.summarize() for a per column view.
+        """
+        if source == target:
+            return []
+        with span('Repository.diff') as timing:
+            changes = MigrationCompactor().compact(
+                self.iter_migrate(source, target))
+            timing.count('changes', len(changes))
+        return changes
+        
+    def sql_plan(self, source, target, dialect, compact=False, rows=None):
+        """Compile the migration from source to target into Statements for 
+        dialect, a dialect name or database URL, without connecting. See 
+        SQLPlan, rows optionally maps table names to row counts."""
+        from evolve.sqlplan import SQLPlan
+        tables = self.checkout_commit(source).schema.tables
+        changes = self.migrate(source, target, compact=compact)
+        return SQLPlan(dialect, tables, rows).compile(changes)
+        
+    def iter_migrate(self, source, target):
+        """Iterate over the changes that migrate source to target.
+        
+        The commit path is resolved up front, the changes are produced 
+        lazily.
+        """
         parent = self.find_common_parent(source, target)
-        source_log = self.rollback(source, parent)
-        target_log = self.rollforward(parent, target)
-        source_log.extend(target_log)
-        return source_log
+        logs = []
+        if source != parent:
+            logs.append(self.iter_rollback(source, parent))
+        if target != parent:
+            logs.append(self.iter_rollforward(parent, target))
+        return itertools.chain(*logs)
         
     def rollback(self, source, target):
         """Returns a list of changes that will rollback source to target."""
+        return list(self.iter_rollback(source, target))
+        
+    def iter_rollback(self, source, target):
         if source == target:
             raise InvalidChange("Can't rollback to self")
-
-        source_commit = self.checkout_commit(source)
-        ancestors = source_commit.get_ancestors()
-        if target not in ancestors:
-            raise CommitNotFound("Did not find %s in the list of ancestors of %s" % (target, source))
-
-        revlog = [self.rev_change_id(ch) for ch in source_commit.changelog]
-        revlog.reverse()
-
-        if source_commit.parent.commit_id != target:
-            parentlog = self.rollback(source_commit.parent.commit_id, target)
-            revlog.extend(parentlog)
-
-        return revlog
+        path = self.commit_path(target, source)
+        path.reverse()
+        return self.iter_changelogs(path, reverse=True)
 
     def rollforward(self, source, target):
         """Return list of changes from source to target."""
+        return list(self.iter_rollforward(source, target))
+        
+    def iter_rollforward(self, source, target):
         if source == target:
             raise InvalidChange("Can't rollforward to self")
-
-        target_commit = self.checkout_commit(target)
-        ancestors = target_commit.get_ancestors()
-        if source not in ancestors:
-            raise CommitNotFound("Did not find %s in the list of ancestors of %s" % (source, target))
-
-        log = [self.changes[ch] for ch in target_commit.changelog]
+        path = self.commit_path(source, target)
+        return self.iter_changelogs(path)
         
-        parent_id = target_commit.parent.commit_id
-        if parent_id != source:
-            parentlog = self.rollforward(source, parent_id)
-            parentlog.extend(log)
-            log = parentlog
+    def commit_path(self, ancestor, descendant):
+        """Return the ids of the commits after ancestor up to and including 
+        descendant, oldest first."""
+        self.index_commit(ancestor)
+        self.index_commit(descendant)
+        if not self.graph.is_ancestor(ancestor, descendant):
+            raise CommitNotFound("Did not find %s in the list of ancestors of %s" % (ancestor, descendant))
+            
+        path = []
+        current = descendant
+        while current != ancestor:
+            path.append(current)
+            current = self.graph.parent(current)
+        path.reverse()
+        return path
         
-        return log
+    def iter_changelogs(self, path, reverse=False):
+        """Iterate over the changes of the commits in path.
+        
+        With reverse, each changelog is walked backwards and every change 
+        is reversed.
+        """
+        for commit_id in path:
+            changelog = self.commits[commit_id]['changelog']
+            if reverse:
+                for change_id in reversed(changelog):
+                    yield self.rev_change_id(change_id)
+            else:
+                for change_id in changelog:
+                    yield self.changes[change_id]
         
     def rev_change_id(self, change_id):
         change = self.changes[change_id]
@@ -1,10 +1,30 @@
+from evolve.instrumentation import span
 import copy
 
 
 class Schema(object):
+    """Tables of a schema, keyed by table id.
+    
+    Table dicts are shared between schemas and never modified in place, 
+    add() replaces a changed table with a modified copy. Copying a schema 
+    therefore only copies the dict of tables.
+    """
     def __init__(self):
         self.tables = {}
         
+    def copy(self):
+        """Return a schema sharing its unchanged tables with this one"""
+        schema = Schema()
+        schema.tables = dict(self.tables)
+        return schema
+        
+    def derive_table(self, table):
+        """Replace table with a copy that can be modified"""
+        derived = dict(self.tables[table])
+        derived['properties'] = dict(derived['properties'])
+        self.tables[table] = derived
+        return derived
+        
     def verify(self, change):
         """Verify change against the working schema"""
         tables = self.tables
@@ -35,37 +55,124 @@ class Schema(object):
                     return False
             return True
 
-    def add(self, change):
-        """Add change to the working changelog, indexed per table, and working schema"""
+    def verify_batch(self, changes):
+        """Verify a list of changes, each against the schema left by the 
+        changes before it.
+        
+        The effect of the changes is tracked in an overlay holding the field 
+        names of the tables they touch, the schema itself is not modified. 
+        Returns a list of violations, empty if every change is valid. A 
+        violation is a dict with the index of the change, its action, table 
+        and field (or None) and a message.
+        """
         tables = self.tables
-        action = change['change']
-        schema = change['schema']
-        table = change['schema']['id']
-        fields = change['schema']['properties']
+        # table -> set of field names, None once dropped
+        overlay = {}
+        violations = []
+        
+        def table_exists(table):
+            if table in overlay:
+                return overlay[table] is not None
+            return table in tables
+            
+        def field_exists(table, field):
+            if table in overlay:
+                return field in overlay[table]
+            return field in tables[table]['properties']
+            
+        def table_fields(table):
+            if overlay.get(table) is None:
+                overlay[table] = set(tables[table]['properties'])
+            return overlay[table]
+        
+        for index, change in enumerate(changes):
+            def violation(message, table=None, field=None):
+                violations.append({
+                    'index': index,
+                    'change': change.get('change'),
+                    'table': table,
+                    'field': field,
+                    'message': message
+                })
+                
+            action = change.get('change')
+            schema = change.get('schema', {})
+            table = schema.get('id')
+            fields = schema.get('properties', {})
+            if table is None:
+                violation("The change does not name a table")
+                continue
+            
+            if action == 'create':
+                if table_exists(table):
+                    violation("The table %s already exists" % table, table)
+                overlay[table] = set(fields)
+                
+            elif action == 'drop':
+                if not table_exists(table):
+                    violation("The table %s does not exist" % table, table)
+                overlay[table] = None
+                
+            elif action in ['alter.add', 'alter.modify', 'alter.rename', 'alter.drop']:
+                if not table_exists(table):
+                    violation("The table %s does not exist" % table, table)
+                    continue
+                for field in fields:
+                    exists = field_exists(table, field)
+                    if action == 'alter.add':
+                        if exists:
+                            violation("The field %s.%s already exists" % (table, field), table, field)
+                        table_fields(table).add(field)
+                        continue
+                    if not exists:
+                        violation("The field %s.%s does not exist" % (table, field), table, field)
+                        continue
+                    if action == 'alter.rename':
+                        newname = fields[field]
+                        if field_exists(table, newname):
+                            violation("The field %s.%s already exists" % (table, newname), table, newname)
+                        table_fields(table).discard(field)
+                        table_fields(table).add(newname)
+                    if action == 'alter.drop':
+                        table_fields(table).discard(field)
+                        
+            else:
+                violation("Unknown change %s" % action, table)
+                
+        return violations
 
-        if action == 'create':
-            tables[table] = schema
+    def add(self, change):
+        """Add change to the working schema. The change is not modified, 
+        make_change_reversible() records what is needed to undo it."""
+        with span('Schema.add', change=change['change']):
+            tables = self.tables
+            action = change['change']
+            schema = change['schema']
+            table = change['schema']['id']
+            fields = change['schema']['properties']
 
-        if action == 'drop':
-            change['old_schema'] = copy.deepcopy(tables[table])
-            del tables[table]
+            if action == 'create':
+                tables[table] = schema
 
-        if action == 'alter.add' or action == 'alter.modify':
-            if action == 'alter.modify':
-                change['old_schema'] = copy.deepcopy(tables[table])
-            for field in fields:
-                tables[table]['properties'][field] = fields[field]
+            if action == 'drop':
+                del tables[table]
 
-        if action == 'alter.rename':
-            for field in fields:
-                newname = fields[field]
-                tables[table]['properties'][newname] = tables[table]['properties'][field]
-                del tables[table]['properties'][field]
+            if action == 'alter.add' or action == 'alter.modify':
+                properties = self.derive_table(table)['properties']
+                for field in fields:
+                    properties[field] = fields[field]
 
-        if action == 'alter.drop':
-            change['old_schema'] = copy.deepcopy(tables[table])
-            for field in fields:
-                del tables[table]['properties'][field]
+            if action == 'alter.rename':
+                properties = self.derive_table(table)['properties']
+                for field in fields:
+                    newname = fields[field]
+                    properties[newname] = properties[field]
+                    del properties[field]
+
+            if action == 'alter.drop':
+                properties = self.derive_table(table)['properties']
+                for field in fields:
+                    del properties[field]
                 
     def make_change_reversible(self, change):
         table = change['schema']['id']
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+
+
+class SnapshotCache(object):
+    """Bounded LRU cache of materialized schema tables, keyed by commit id.
+
+    Commits are content addressed and never change once written, so a
+    cached snapshot never needs to be invalidated, only evicted.
+    """
+    def __init__(self, size=32):
+        self.size = size
+        self.snapshots = OrderedDict()
+
+    def __contains__(self, commit_id):
+        return commit_id in self.snapshots
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def get(self, commit_id):
+        """Return the cached tables for commit_id or None"""
+        try:
+            tables = self.snapshots.pop(commit_id)
+        except KeyError:
+            return None
+        self.snapshots[commit_id] = tables
+        return tables
+
+    def put(self, commit_id, tables):
+        if self.size <= 0:
+            return
+        if commit_id in self.snapshots:
+            del self.snapshots[commit_id]
+        self.snapshots[commit_id] = tables
+        while len(self.snapshots) > self.size:
+            self.snapshots.popitem(last=False)
+
+    def clear(self):
+        self.snapshots.clear()
@@ -0,0 +1,317 @@
+"""Compile changes into SQL without connecting to a database.
+
+SQLPlan turns a list of changes, e.g. the result of Repository.migrate,
+into the statements DatabaseRepository would run on a dialect, batched
+into the same steps, see evolve.steps. Each statement carries an
+estimated cost: 'metadata' when the database only updates its catalog,
+'rewrite' when every row of the table is read or written.
+"""
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.schema import CreateTable
+from evolve.json2sql import column_type
+from evolve.exceptions import TableNotFound
+from evolve.schema import Schema
+from evolve.steps import plan_steps
+
+METADATA = 'metadata'
+REWRITE = 'rewrite'
+
+
+def get_dialect(dialect):
+    """Return a dialect instance for a dialect name or a database URL"""
+    if hasattr(dialect, 'type_compiler'):
+        return dialect
+    if '://' not in dialect:
+        dialect = '%s://' % dialect
+    return make_url(dialect).get_dialect()()
+
+
+class Statement(object):
+    def __init__(self, sql, table, change, cost, rows=None):
+        self.sql = sql
+        self.table = table
+        self.change = change
+        self.cost = cost
+        self.rows = rows
+
+    def to_dict(self):
+        return {
+            "sql": self.sql,
+            "table": self.table,
+            "change": self.change,
+            "cost": self.cost,
+            "rows": self.rows
+        }
+
+    def __str__(self):
+        return self.sql
+
+
+class SQLPlan(object):
+    """Compile changes for one dialect.
+
+    tables is the schema the changes start from, {table name: table
+    schema}, needed where a statement restates a column or a table (MySQL
+    renames, SQLite rebuilds). rows is an optional {table name: row
+    count} used to estimate the rows a rewrite touches.
+    """
+    # cost of each action per dialect, alter.modify may be cheaper, see
+    # modify_cost()
+    costs = {
+        'postgresql': {
+            'alter.add': METADATA,
+            'alter.drop': METADATA,
+            'alter.rename': METADATA,
+            'alter.modify': REWRITE
+        },
+        'mssql': {
+            'alter.add': METADATA,
+            'alter.drop': METADATA,
+            'alter.rename': METADATA,
+            'alter.modify': REWRITE
+        },
+        'mysql': {
+            'alter.add': REWRITE,
+            'alter.drop': REWRITE,
+            'alter.rename': METADATA,
+            'alter.modify': REWRITE
+        },
+        'sqlite': {
+            'alter.add': METADATA,
+            'alter.drop': REWRITE,
+            'alter.rename': REWRITE,
+            'alter.modify': REWRITE
+        }
+    }
+    # dialects that widen a varchar without touching the rows
+    widening_dialects = ['postgresql', 'mssql']
+    # dialects that alter anything but added columns by rebuilding the table
+    rebuild_dialects = ['sqlite']
+    # dialects that add or drop several columns in one ALTER, as
+    # Database.add_columns() and drop_columns() do
+    multi_column_alter_dialects = ['postgresql', 'mysql']
+    rebuilt_actions = ['alter.drop', 'alter.rename', 'alter.modify']
+
+    def __init__(self, dialect, tables=None, rows=None):
+        self.dialect = get_dialect(dialect)
+        self.preparer = self.dialect.identifier_preparer
+        self.schema = Schema()
+        self.schema.tables = dict(tables or {})
+        self.rows = rows or {}
+
+    @property
+    def dialect_name(self):
+        return self.dialect.name
+
+    def compile(self, changes):
+        """Return the list of Statements for changes, step by step as 
+        DatabaseRepository.deploy_plan() runs them"""
+        statements = []
+        for table_name, step in plan_steps(changes):
+            statements.extend(self.compile_step(table_name, step))
+        return statements
+        
+    def compile_step(self, table_name, changes):
+        """Like DatabaseRepository.deploy_step(), a step with alters SQLite 
+        can not run in place rebuilds the table once per batch of alters"""
+        rebuilt = [change for change in changes 
+            if change["change"] in self.rebuilt_actions]
+        if self.dialect_name not in self.rebuild_dialects or not rebuilt:
+            statements = []
+            for change in changes:
+                statements.extend(self.compile_change(change))
+                self.add(change)
+            return statements
+        statements = []
+        batch = []
+        for change in changes + [None]:
+            if change is not None and change["change"].startswith("alter."):
+                batch.append(change)
+                continue
+            if batch:
+                statements.extend(self.rebuild(table_name, batch))
+                for altered in batch:
+                    self.add(altered)
+                batch = []
+            if change is not None:
+                statements.extend(self.compile_change(change))
+                self.add(change)
+        return statements
+        
+    def add(self, change):
+        """Apply change to the schema the next statements start from"""
+        table_name = change["schema"]["id"]
+        if change["change"] == "create" or table_name in self.schema.tables:
+            self.schema.add(change)
+
+    def script(self, changes):
+        """Return the statements for changes as a SQL script, each
+        preceded by a comment with its cost"""
+        lines = []
+        for statement in self.compile(changes):
+            comment = "-- %s %s: %s" % (statement.change, statement.table,
+                statement.cost)
+            if statement.rows:
+                comment += ", ~%d rows" % statement.rows
+            lines.append(comment)
+            lines.append("%s;" % statement.sql.strip())
+        return "\n".join(lines) + "\n"
+
+    def compile_change(self, change):
+        action = change["change"]
+        schema = change["schema"]
+        if action == "create":
+            return [self.statement(self.create_table(schema), schema["id"],
+                action, METADATA)]
+        if action == "drop":
+            return [self.statement("DROP TABLE %s" % self.quote(schema["id"]),
+                schema["id"], action, METADATA)]
+        cost = self.costs.get(self.dialect_name, {}).get(action, REWRITE)
+        if action == "alter.modify":
+            cost = self.modify_cost(change)
+        compiler = getattr(self, action.replace(".", "_"))
+        return [self.statement(sql, schema["id"], action, cost)
+            for sql in compiler(schema)]
+
+    def modify_cost(self, change):
+        """Widening a varchar is a metadata change on widening_dialects"""
+        cost = self.costs.get(self.dialect_name, {}).get("alter.modify", REWRITE)
+        if self.dialect_name not in self.widening_dialects:
+            return cost
+        old_properties = change.get("old_schema", {}).get("properties", {})
+        for name, prop in change["schema"]["properties"].items():
+            old_prop = old_properties.get(name)
+            if not old_prop or not self.widens(old_prop, prop):
+                return cost
+        return METADATA
+
+    def widens(self, old_prop, prop):
+        if old_prop.get("type") != "string" or prop.get("type") != "string":
+            return False
+        old_length = old_prop.get("maxLength")
+        length = prop.get("maxLength")
+        return bool(old_length and length and length >= old_length)
+
+    def statement(self, sql, table_name, action, cost):
+        rows = None
+        if cost == REWRITE:
+            rows = self.rows.get(table_name)
+        elif table_name in self.rows:
+            rows = 0
+        return Statement(sql, table_name, action, cost, rows)
+
+    def quote(self, name):
+        """Quote name where the dialect requires it, as CreateTable does"""
+        return self.preparer.quote(name, None)
+
+    def column(self, name, prop):
+        return Column(name, column_type(prop),
+            primary_key=bool(prop.get("identity")))
+
+    def column_type(self, prop):
+        return self.dialect.type_compiler.process(column_type(prop))
+
+    def create_table(self, schema, table_name=None):
+        columns = [self.column(name, prop)
+            for name, prop in sorted(schema["properties"].items())]
+        table = Table(table_name or schema["id"], MetaData(), *columns)
+        return str(CreateTable(table).compile(dialect=self.dialect)).strip()
+
+    def table_schema(self, table_name):
+        try:
+            return self.schema.tables[table_name]
+        except KeyError:
+            raise TableNotFound(table_name)
+
+    def alter_table(self, table_name, clauses):
+        """One ALTER for all clauses on multi_column_alter_dialects, one per 
+        clause elsewhere"""
+        if self.dialect_name in self.multi_column_alter_dialects:
+            clauses = [", ".join(clauses)]
+        return ["ALTER TABLE %s %s" % (self.quote(table_name), clause)
+            for clause in clauses]
+
+    def alter_add(self, schema):
+        add = "ADD COLUMN"
+        if self.dialect_name == "mssql":
+            add = "ADD"
+        return self.alter_table(schema["id"], ["%s %s %s" % (add,
+            self.quote(name), self.column_type(prop))
+            for name, prop in sorted(schema["properties"].items())])
+
+    def alter_drop(self, schema):
+        return self.alter_table(schema["id"], ["DROP COLUMN %s" % 
+            self.quote(name) for name in sorted(schema["properties"])])
+
+    def alter_rename(self, schema):
+        table_name = schema["id"]
+        statements = []
+        for name, new_name in sorted(schema["properties"].items()):
+            if self.dialect_name == "mysql":
+                prop = self.table_schema(table_name)["properties"][name]
+                statements.append("ALTER TABLE %s CHANGE %s %s %s" % (
+                    self.quote(table_name), self.quote(name),
+                    self.quote(new_name), self.column_type(prop)))
+            elif self.dialect_name == "mssql":
+                statements.append("EXEC sp_rename '%s.%s', '%s', 'COLUMN'" % (
+                    table_name, name, new_name))
+            else:
+                statements.append("ALTER TABLE %s RENAME COLUMN %s TO %s" % (
+                    self.quote(table_name), self.quote(name),
+                    self.quote(new_name)))
+        return statements
+
+    def alter_modify(self, schema):
+        if self.dialect_name == "mysql":
+            template = "ALTER TABLE %s MODIFY %s %s"
+        elif self.dialect_name == "mssql":
+            template = "ALTER TABLE %s ALTER COLUMN %s %s"
+        else:
+            template = "ALTER TABLE %s ALTER COLUMN %s TYPE %s"
+        return [template % (self.quote(schema["id"]), self.quote(name),
+            self.column_type(prop))
+            for name, prop in sorted(schema["properties"].items())]
+
+    def rebuild(self, table_name, changes):
+        """The statements of Database.rebuild_table for a batch of alters"""
+        old_schema = self.table_schema(table_name)
+        new_schema = Schema()
+        new_schema.tables = {table_name: old_schema}
+        # column name -> name of the column its values are copied from
+        sources = dict((name, name) for name in old_schema["properties"])
+        actions = []
+        for change in changes:
+            action = change["change"]
+            if action not in actions:
+                actions.append(action)
+            if action == "alter.rename":
+                for name, new_name in change["schema"]["properties"].items():
+                    source = sources.pop(name, None)
+                    if source is not None:
+                        sources[new_name] = source
+            elif action == "alter.drop":
+                for name in change["schema"]["properties"]:
+                    sources.pop(name, None)
+            new_schema.add(change)
+        new_table = new_schema.tables[table_name]
+        action = ", ".join(actions)
+        copied = sorted([(name, sources[name])
+            for name in new_table["properties"] if name in sources])
+
+        rebuild_name = "_evolve_rebuild_%s" % table_name
+        sql = [self.create_table(new_table, rebuild_name)]
+        if copied:
+            sql.append("INSERT INTO %s (%s) SELECT %s FROM %s" % (
+                self.quote(rebuild_name),
+                ", ".join([self.quote(name) for name, source in copied]),
+                ", ".join([self.quote(source) for name, source in copied]),
+                self.quote(table_name)))
+        sql.append("DROP TABLE %s" % self.quote(table_name))
+        sql.append("ALTER TABLE %s RENAME TO %s" % (self.quote(rebuild_name),
+            self.quote(table_name)))
+        costs = [METADATA] * len(sql)
+        if copied:
+            costs[1] = REWRITE
+        return [self.statement(statement, table_name, action, cost)
+            for statement, cost in zip(sql, costs)]
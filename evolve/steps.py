@@ -0,0 +1,58 @@
+"""Group a migration into the steps a deploy runs.
+
+Consecutive changes to the same table form one step, and within a step
+consecutive alters of the same kind are merged into one change, so a
+step's columns are altered together. DatabaseRepository deploys these
+steps and SQLPlan compiles them, both without a connection being needed
+to plan them.
+"""
+
+
+def plan_steps(changes):
+    """Return a list of (table name, changes) tuples"""
+    steps = []
+    for change in changes:
+        table_name = change["schema"]["id"]
+        if not steps or steps[-1][0] != table_name:
+            steps.append((table_name, []))
+        step = steps[-1][1]
+        if step and can_merge(step[-1], change):
+            step[-1] = merge(step[-1], change)
+        else:
+            step.append(change)
+    return steps
+
+
+def can_merge(change, other):
+    action = change["change"]
+    if action != other["change"] or not action.startswith("alter."):
+        return False
+    properties = change["schema"]["properties"]
+    other_properties = other["schema"]["properties"]
+    for name in other_properties:
+        if name in properties:
+            return False
+    if action == "alter.rename":
+        # the renames must not depend on each other's order
+        for name in other_properties.values():
+            if name in properties:
+                return False
+        for name in properties.values():
+            if name in other_properties:
+                return False
+    return True
+
+
+def merge(change, other):
+    merged = {"change": change["change"], "schema": dict(change["schema"])}
+    properties = dict(change["schema"]["properties"])
+    properties.update(other["schema"]["properties"])
+    merged["schema"]["properties"] = properties
+    if "old_schema" in change or "old_schema" in other:
+        old_properties = {}
+        for item in (change, other):
+            if "old_schema" in item:
+                old_properties.update(item["old_schema"]["properties"])
+        merged["old_schema"] = dict(change.get("old_schema", other.get("old_schema")))
+        merged["old_schema"]["properties"] = old_properties
+    return merged
@@ -0,0 +1,82 @@
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+
+class Storage(object):
+    """Backend for the commits, changes and snapshots of a Repository.
+
+    Objects are addressed by type ('commit', 'change' or 'snapshot') and
+    id. Backends only need to fetch, store and list objects, Repository
+    reaches them through ObjectMap.
+    """
+    def get(self, _type, object_id):
+        """Return the object, raises KeyError if it does not exist"""
+        raise NotImplementedError
+
+    def put(self, _type, object_id, data):
+        raise NotImplementedError
+
+    def contains(self, _type, object_id):
+        try:
+            self.get(_type, object_id)
+            return True
+        except KeyError:
+            return False
+
+    def ids(self, _type):
+        """Return the ids of every stored object of the given type"""
+        raise NotImplementedError
+
+
+class ObjectMap(MutableMapping):
+    """Dict of one type of object, fetched from a Storage on demand.
+
+    Fetched objects are kept so each object is read at most once, passed
+    through load first if it is given. Setting an item writes it through
+    to the storage. Items passed as cached are only kept in memory.
+    """
+    def __init__(self, storage, _type, cached=None, load=None):
+        self.storage = storage
+        self.type = _type
+        self.load = load
+        self.cache = dict(cached or {})
+        self.memory_only = set(self.cache.keys())
+
+    def __getitem__(self, object_id):
+        try:
+            return self.cache[object_id]
+        except KeyError:
+            pass
+        data = self.storage.get(self.type, object_id)
+        if self.load:
+            data = self.load(data)
+        self.cache[object_id] = data
+        return data
+
+    def __setitem__(self, object_id, data):
+        self.cache[object_id] = data
+        self.storage.put(self.type, object_id, data)
+
+    def __delitem__(self, object_id):
+        raise TypeError("Stored objects can not be deleted")
+
+    def __contains__(self, object_id):
+        if object_id in self.cache:
+            return True
+        return self.storage.contains(self.type, object_id)
+
+    def __iter__(self):
+        ids = set(self.memory_only)
+        ids.update(self.storage.ids(self.type))
+        return iter(ids)
+
+    def __len__(self):
+        return len(set(self))
+
+    def get(self, object_id, default=None):
+        try:
+            return self[object_id]
+        except KeyError:
+            return default
@@ -0,0 +1,85 @@
+import unittest
+import os
+import shutil
+from evolve.commands.push import push
+from evolve.commands.clone import clone
+from evolve.commands.init import init_db
+from evolve.commands.deploy import deploy
+from evolve.file_repository import FileRepository
+from evolve.repository import Repository
+
+
+class PushCloneTests(unittest.TestCase):
+    def setUp(self):
+        self.test_path = 'test_push'
+        self.clone_path = 'test_clone'
+        self.target = 'sqlite:///test_push.db'
+        repo = FileRepository()
+        repo.initialize(self.test_path)
+        repository = Repository()
+        repository.branch('master')
+        repository.commit('master', [{
+            "change":"create",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }], 'create person')
+        repo.save(self.test_path, repository)
+        self.head = repository.branches['master']
+        
+    def tearDown(self):
+        for path in [self.test_path, self.clone_path]:
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        if os.path.exists('test_push.db'):
+            os.remove('test_push.db')
+            
+    def test_push_requires_initialized_database(self):
+        self.assertFalse(push(self.target, directory=self.test_path))
+        
+    def test_push_unknown_branch(self):
+        init_db(self.target)
+        self.assertFalse(push(self.target, 'other', directory=self.test_path))
+            
+    def test_push_and_clone(self):
+        init_db(self.target)
+        self.assertTrue(push(self.target, 'master', directory=self.test_path))
+        self.assertTrue(clone(self.target, self.clone_path))
+        repository = FileRepository().load(self.clone_path)
+        master = repository.checkout_branch('master')
+        self.assertEqual(master.commit_id, self.head)
+        self.assertTrue('person' in master.schema.tables)
+        self.assertFalse(clone(self.target, self.clone_path))
+
+        
+    def test_deploy(self):
+        init_db(self.target)
+        self.assertTrue(deploy(self.target, 'master', self.test_path))
+        self.assertTrue(deploy(self.target, 'master', self.test_path))
+        self.assertFalse(deploy(self.target, 'other', self.test_path))
+        
+    def test_deploy_does_not_hide_errors(self):
+        from evolve.database_repository import DatabaseRepository
+        def deploy_commit(self, repository, commit_id, **kwargs):
+            raise KeyError('missing column')
+        init_db(self.target)
+        original = DatabaseRepository.deploy_commit
+        DatabaseRepository.deploy_commit = deploy_commit
+        try:
+            self.assertRaises(KeyError, deploy, self.target, 'master', 
+                self.test_path)
+        finally:
+            DatabaseRepository.deploy_commit = original
+        
+    def test_deploy_from_database(self):
+        init_db(self.target)
+        push(self.target, directory=self.test_path)
+        self.assertTrue(deploy(self.target, 'master', self.clone_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
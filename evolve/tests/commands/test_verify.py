@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+from evolve.commands.verify import *
+from evolve.file_repository import FileRepository
+from evolve.repository import Repository
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class VerifyTests(unittest.TestCase):
+    def setUp(self):
+        self.test_path = 'test_verify'
+        repo = FileRepository()
+        repo.initialize(self.test_path)
+        repository = Repository()
+        repository.branch('master')
+        repository.commit('master', [{
+            "change":"create",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }], 'create person')
+        repo.save(self.test_path, repository)
+        self.changes_file = os.path.join(self.test_path, 'changes.json')
+        
+    def tearDown(self):
+        if os.path.exists(self.test_path):
+            shutil.rmtree(self.test_path)
+            
+    def write_changes(self, changes):
+        f = open(self.changes_file, 'w')
+        json.dump({"changes": changes}, f)
+        f.close()
+        
+    def test_verify_valid_changes(self):
+        self.write_changes([{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "name":{"type":"string"}
+                }
+            }
+        }])
+        self.assertTrue(verify_changes('master', self.changes_file))
+        
+    def test_verify_invalid_changes(self):
+        self.write_changes([{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }])
+        self.assertFalse(verify_changes('master', self.changes_file))
+        
+    def test_verify_unknown_branch(self):
+        self.write_changes([])
+        self.assertFalse(verify_changes('does_not_exist', self.changes_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
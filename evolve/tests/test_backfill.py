@@ -0,0 +1,89 @@
+import unittest
+import os
+from evolve.backfill import *
+from evolve.db import Database
+from sqlalchemy import *
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.dbstring = 'sqlite:///test_backfill.db'
+        self.database = Database(self.dbstring)
+        self.engine = self.database.engine
+        self.engine.execute("CREATE TABLE person (id INTEGER PRIMARY KEY, "
+            "name VARCHAR(40), copy VARCHAR(40))")
+        for i in range(25):
+            self.engine.execute("INSERT INTO person (id, name) VALUES (%d, 'n%d')" 
+                % (i, i))
+            
+    def tearDown(self):
+        if os.path.exists('test_backfill.db'):
+            os.remove('test_backfill.db')
+            
+    def test_key(self):
+        backfill = Backfill(self.database, 'person')
+        self.assertEqual(backfill.key(), 'id')
+        
+    def test_copy_in_chunks(self):
+        reports = []
+        backfill = Backfill(self.database, 'person', chunk_size=10, 
+            progress=lambda progress: reports.append(progress.report()))
+        progress = backfill.copy('name', 'copy')
+        self.assertEqual(progress.rows, 25)
+        self.assertEqual([report['rows'] for report in reports], [10, 20, 25])
+        self.assertEqual(reports[-1]['total'], 25)
+        self.assertEqual(reports[-1]['eta'], 0)
+        rows = self.engine.execute(
+            "SELECT count(*) FROM person WHERE copy = name").scalar()
+        self.assertEqual(rows, 25)
+        
+    def test_fill_only_nulls(self):
+        self.engine.execute("UPDATE person SET copy = 'kept' WHERE id < 5")
+        backfill = Backfill(self.database, 'person', chunk_size=7)
+        progress = backfill.fill('copy', 'filled')
+        self.assertEqual(progress.rows, 20)
+        rows = self.engine.execute(
+            "SELECT copy, count(*) FROM person GROUP BY copy ORDER BY copy").fetchall()
+        self.assertEqual([tuple(row) for row in rows], 
+            [('filled', 20), ('kept', 5)])
+            
+    def test_catch_up(self):
+        backfill = Backfill(self.database, 'person', chunk_size=10)
+        backfill.copy('name', 'copy')
+        self.engine.execute("UPDATE person SET name = 'changed' WHERE id = 3")
+        connection = self.engine.connect()
+        try:
+            self.assertEqual(backfill.catch_up(connection, 'name', 'copy'), 1)
+        finally:
+            connection.close()
+        
+    def test_catch_up_nulls(self):
+        backfill = Backfill(self.database, 'person', chunk_size=10)
+        backfill.copy('name', 'copy')
+        self.engine.execute("UPDATE person SET name = NULL WHERE id = 3")
+        self.engine.execute("UPDATE person SET name = 'set', copy = NULL "
+            "WHERE id = 4")
+        connection = self.engine.connect()
+        try:
+            self.assertEqual(backfill.catch_up(connection, 'name', 'copy'), 2)
+        finally:
+            connection.close()
+        rows = self.engine.execute("SELECT id, copy FROM person "
+            "WHERE id IN (3, 4) ORDER BY id").fetchall()
+        self.assertEqual([tuple(row) for row in rows], [(3, None), (4, 'set')])
+        
+    def test_empty_table(self):
+        self.engine.execute("DELETE FROM person")
+        progress = Backfill(self.database, 'person').copy('name', 'copy')
+        self.assertEqual(progress.rows, 0)
+        self.assertEqual(progress.chunks, 0)
+        
+    def test_progress_str(self):
+        progress = Progress('person', 'name', 200)
+        self.assertTrue('eta ?' in str(progress))
+        progress.advance(50)
+        self.assertTrue('50/200 rows (25.0%)' in str(progress))
+
+
+if __name__ == '__main__':
+    unittest.main()
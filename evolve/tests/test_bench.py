@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+from evolve.bench import *
+from evolve.bench.__main__ import main
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class BenchTests(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists('test_bench.json'):
+            os.remove('test_bench.json')
+            
+    def test_generate_repository(self):
+        repository = generate_repository(5, 2, 3, 4, branch_depth=2)
+        master = repository.checkout_branch('master')
+        self.assertEqual(len(master.schema.tables), 3)
+        self.assertEqual(repository.get_depth(repository.branches['master']), 6)
+        self.assertEqual(repository.get_depth(repository.branches['b1']), 8)
+        
+    def test_benchmark(self):
+        results = benchmark(5, 2, 3, 4, repeat=1)
+        operations = [result['operation'] for result in results]
+        self.assertTrue('migrate' in operations)
+        self.assertTrue('checkout_commit (full replay)' in operations)
+        for result in results:
+            self.assertTrue(result['min'] >= 0)
+            
+    def test_measurement(self):
+        calls = []
+        result = Measurement(repeat=2).run(lambda: calls.append(1))
+        self.assertEqual(result['repeat'], 2)
+        self.assertTrue(result['min'] <= result['max'])
+        self.assertTrue(len(calls) >= 2)
+        
+    def test_main_rejects_zero_tables(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self.assertRaises(SystemExit, main, ['--tables', '0'])
+            output = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertTrue('--tables' in output)
+        
+    def test_main_writes_json(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            main(['--depth', '3', '--tables', '2', '--columns', '2', 
+                '--repeat', '1', '--output', 'test_bench.json'])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertTrue('depth=3' in output)
+        f = open('test_bench.json')
+        data = json.load(f)
+        f.close()
+        self.assertTrue(data['results'])
+        self.assertTrue('python' in data['environment'])
+
+
+if __name__ == '__main__':
+    unittest.main()
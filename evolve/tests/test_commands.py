@@ -0,0 +1,51 @@
+import unittest
+import sys
+from evolve.commands import *
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class CommandsTests(unittest.TestCase):
+    def test_registered_commands_exist(self):
+        for command, module in commands.items():
+            _mod = __import__(module, fromlist=['run'])
+            self.assertTrue(hasattr(_mod, 'run'), command)
+            
+    def test_file_commands_do_not_import_sqlalchemy(self):
+        saved = dict(sys.modules)
+        try:
+            for name in list(sys.modules.keys()):
+                if name.startswith('evolve') or name.startswith('sqlalchemy') or name.startswith('migrate'):
+                    del sys.modules[name]
+            __import__('evolve.commands.init')
+            __import__('evolve.commands.verify')
+            __import__('evolve.commands.pack')
+            __import__('evolve.commands.push')
+            __import__('evolve.commands.clone')
+            __import__('evolve.commands.deploy')
+            self.assertFalse('sqlalchemy' in sys.modules)
+        finally:
+            sys.modules.clear()
+            sys.modules.update(saved)
+            
+    def test_import_profiler(self):
+        profiler = ImportProfiler()
+        profiler.install()
+        try:
+            __import__('evolve_module_that_does_not_exist')
+        except ImportError:
+            pass
+        finally:
+            profiler.uninstall()
+        names = [name for elapsed, name in profiler.timings]
+        self.assertTrue('evolve_module_that_does_not_exist' in names)
+        out = StringIO()
+        profiler.report(out)
+        self.assertTrue('evolve_module_that_does_not_exist' in out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
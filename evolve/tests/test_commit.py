@@ -25,6 +25,10 @@ class TestEvolveCommit(unittest.TestCase):
         self.assertTrue('root' in a)
         self.assertTrue(commit.commit_id in a)
         
+    def test_get_ancestors_order(self):
+        commit = self.repo.checkout_branch('master')
+        self.assertEqual(commit.get_ancestors(), ['root', commit.commit_id])
+        
     def test_to_dict_msg(self):
         commit = self.repo.checkout_branch('master')
         commit_dict = commit.to_dict()
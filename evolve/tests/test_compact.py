@@ -0,0 +1,252 @@
+import unittest
+import copy
+import random
+from evolve.compact import *
+from evolve.schema import Schema
+
+
+def alter(action, properties, old_properties=None, table='person'):
+    change = {
+        "change": action,
+        "schema": {"id": table, "type": "object", "properties": properties}
+    }
+    if old_properties is not None:
+        change["old_schema"] = {
+            "id": table, "type": "object", "properties": old_properties
+        }
+    return change
+
+
+def create(properties, table='person'):
+    return alter('create', properties, table=table)
+
+
+def drop(properties, table='person'):
+    return alter('drop', properties, table=table)
+
+
+class MigrationCompactorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tables = {
+            "person": {
+                "id": "person",
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string"},
+                    "name": {"type": "string"}
+                }
+            }
+        }
+
+    def apply(self, changes):
+        schema = Schema()
+        schema.tables = copy.deepcopy(self.tables)
+        for change in changes:
+            schema.add(copy.deepcopy(change))
+        return schema.tables
+
+    def assertCompacts(self, changes, length):
+        compacted = compact(changes)
+        self.assertEqual(self.apply(compacted), self.apply(changes))
+        self.assertEqual(len(compacted), length)
+        return compacted
+
+
+class TestMigrationCompactor(MigrationCompactorTestCase):
+    def test_add_drop_cancels(self):
+        changes = [
+            alter('alter.add', {"age": {"type": "number"}}),
+            alter('alter.drop', {"age": {"type": "number"}})
+        ]
+        self.assertCompacts(changes, 0)
+
+    def test_rename_chain_folds(self):
+        changes = [
+            alter('alter.rename', {"name": "full_name"}),
+            alter('alter.rename', {"full_name": "display_name"})
+        ]
+        compacted = self.assertCompacts(changes, 1)
+        self.assertEqual(compacted[0]['schema']['properties'],
+            {"name": "display_name"})
+
+    def test_rename_back_cancels(self):
+        changes = [
+            alter('alter.rename', {"name": "full_name"}),
+            alter('alter.rename', {"full_name": "name"})
+        ]
+        self.assertCompacts(changes, 0)
+
+    def test_swap_keeps_renames(self):
+        changes = [
+            alter('alter.rename', {"name": "tmp"}),
+            alter('alter.rename', {"id": "name"}),
+            alter('alter.rename', {"tmp": "id"})
+        ]
+        self.assertCompacts(changes, 3)
+
+    def test_modifies_collapse(self):
+        changes = [
+            alter('alter.modify', {"name": {"type": "string", "maxLength": 40}},
+                {"name": {"type": "string"}}),
+            alter('alter.modify', {"name": {"type": "string", "maxLength": 80}},
+                {"name": {"type": "string", "maxLength": 40}})
+        ]
+        compacted = self.assertCompacts(changes, 1)
+        self.assertEqual(compacted[0]['old_schema']['properties'],
+            {"name": {"type": "string"}})
+
+    def test_modify_back_cancels(self):
+        changes = [
+            alter('alter.modify', {"name": {"type": "string", "maxLength": 40}},
+                {"name": {"type": "string"}}),
+            alter('alter.modify', {"name": {"type": "string"}},
+                {"name": {"type": "string", "maxLength": 40}})
+        ]
+        self.assertCompacts(changes, 0)
+
+    def test_modify_dropped_field(self):
+        changes = [
+            alter('alter.modify', {"name": {"type": "string", "maxLength": 40}},
+                {"name": {"type": "string"}}),
+            alter('alter.drop', {"name": {"type": "string", "maxLength": 40}})
+        ]
+        compacted = self.assertCompacts(changes, 1)
+        self.assertEqual(compacted[0]['schema']['properties'],
+            {"name": {"type": "string"}})
+
+    def test_modify_added_field_folds_into_add(self):
+        changes = [
+            alter('alter.add', {"age": {"type": "number"}}),
+            alter('alter.modify', {"age": {"type": "integer"}},
+                {"age": {"type": "number"}})
+        ]
+        compacted = self.assertCompacts(changes, 1)
+        self.assertEqual(compacted[0]['change'], 'alter.add')
+
+    def test_drop_and_add_same_field(self):
+        changes = [
+            alter('alter.drop', {"name": {"type": "string"}}),
+            alter('alter.add', {"name": {"type": "number"}})
+        ]
+        self.assertCompacts(changes, 2)
+
+    def test_dropped_table_discards_alters(self):
+        changes = [
+            alter('alter.add', {"age": {"type": "number"}}),
+            alter('alter.rename', {"name": "full_name"}),
+            drop({"id": {"type": "string"}, "full_name": {"type": "string"},
+                "age": {"type": "number"}})
+        ]
+        compacted = self.assertCompacts(changes, 1)
+        self.assertEqual(compacted[0]['change'], 'drop')
+
+    def test_created_and_dropped_table_cancels(self):
+        changes = [
+            create({"id": {"type": "string"}}, table='pet'),
+            alter('alter.add', {"age": {"type": "number"}}, table='pet'),
+            drop({"id": {"type": "string"}, "age": {"type": "number"}},
+                table='pet')
+        ]
+        self.assertCompacts(changes, 0)
+
+    def test_created_table_absorbs_alters(self):
+        changes = [
+            create({"id": {"type": "string"}}, table='pet'),
+            alter('alter.add', {"age": {"type": "number"}}, table='pet'),
+            alter('alter.rename', {"age": "years"}, table='pet')
+        ]
+        compacted = self.assertCompacts(changes, 1)
+        self.assertEqual(sorted(compacted[0]['schema']['properties'].keys()),
+            ['id', 'years'])
+
+    def test_recreated_table(self):
+        changes = [
+            drop(self.tables['person']['properties']),
+            create({"id": {"type": "number"}}),
+            alter('alter.add', {"name": {"type": "string"}})
+        ]
+        self.assertCompacts(changes, 2)
+
+    def test_does_not_modify_changes(self):
+        changes = [
+            alter('alter.add', {"age": {"type": "number"}}),
+            alter('alter.modify', {"age": {"type": "integer"}},
+                {"age": {"type": "number"}})
+        ]
+        original = copy.deepcopy(changes)
+        compacted = compact(changes)
+        compacted[0]['schema']['properties']['age']['type'] = 'string'
+        self.assertEqual(changes, original)
+
+    def test_random_migrations(self):
+        """Compacted random migrations give the same schema"""
+        rand = random.Random(42)
+        types = [{"type": "string"}, {"type": "number"},
+            {"type": "string", "maxLength": 40}]
+        for run in range(300):
+            schema = Schema()
+            schema.tables = copy.deepcopy(self.tables)
+            changes = []
+            for step in range(rand.randint(1, 12)):
+                tables = schema.tables
+                table = rand.choice(['person', 'pet'])
+                if table not in tables:
+                    change = create({"id": rand.choice(types)}, table=table)
+                else:
+                    fields = list(tables[table]['properties'].keys())
+                    action = rand.choice(['drop', 'alter.add', 'alter.drop',
+                        'alter.modify', 'alter.rename'])
+                    name = rand.choice(fields) if fields else None
+                    new_name = rand.choice(['a', 'b', 'c', 'id', 'name'])
+                    if action == 'drop':
+                        change = drop(copy.deepcopy(tables[table]['properties']),
+                            table=table)
+                    elif action == 'alter.add' or name is None:
+                        if new_name in fields:
+                            continue
+                        change = alter('alter.add',
+                            {new_name: rand.choice(types)}, table=table)
+                    elif action == 'alter.drop':
+                        change = alter('alter.drop',
+                            {name: tables[table]['properties'][name]},
+                            table=table)
+                    elif action == 'alter.modify':
+                        change = alter('alter.modify',
+                            {name: rand.choice(types)},
+                            {name: tables[table]['properties'][name]},
+                            table=table)
+                    else:
+                        if new_name in fields:
+                            continue
+                        change = alter('alter.rename', {name: new_name},
+                            table=table)
+                change = copy.deepcopy(change)
+                changes.append(copy.deepcopy(change))
+                schema.add(change)
+            compacted = compact(changes)
+            self.assertEqual(self.apply(compacted), schema.tables)
+            self.assertTrue(len(compacted) <= len(changes) + 2)
+
+
+class TestSummarize(unittest.TestCase):
+    def test_summarize(self):
+        summary = summarize([
+            alter('alter.add', {"age": {"type": "number"}}),
+            alter('alter.rename', {"name": "full_name"}),
+            alter('alter.modify', {"id": {"type": "number"}}, 
+                {"id": {"type": "string"}}),
+            create({"id": {"type": "string"}}, table='pet')
+        ])
+        self.assertEqual(summary, {
+            "person": {
+                "alter.add": {"age": {"type": "number"}},
+                "alter.rename": {"name": "full_name"},
+                "alter.modify": {"id": {
+                    "from": {"type": "string"}, "to": {"type": "number"}}}
+            },
+            "pet": {"create": {"id": {"type": "string"}}}
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
 import unittest
 import os
+import threading
 from evolve.database_repository import DatabaseRepository
 from evolve.database_repository import RepositoryAlreadyExists
+from evolve.database_repository import RepositoryNotFound
+from evolve.db import Database
+from evolve.instrumentation import Collector
+from evolve.repository import Repository
 from sqlalchemy import *
+from sqlalchemy import event
+from sqlalchemy import pool
 from migrate import *
 
 
@@ -62,6 +69,487 @@ class TestDatabaseRepository(unittest.TestCase):
         repository.deploy(change)
         self.assertTableExists(dbstring, "test")
         
+    def alter(self, action, properties, old_properties=None):
+        change = {
+            "change": action,
+            "schema": {
+                "id": "test",
+                "type": "object",
+                "properties": properties
+            }
+        }
+        if old_properties is not None:
+            change["old_schema"] = {
+                "id": "test",
+                "type": "object",
+                "properties": old_properties
+            }
+        return change
+        
+    def reflect_columns(self, dbstring, table_name):
+        engine = create_engine(dbstring)
+        metadata = MetaData(engine)
+        table = Table(table_name, metadata, autoload=True)
+        return dict((column.name, column) for column in table.columns)
+        
+    def test_plan_steps_groups_tables(self):
+        repository = DatabaseRepository(self.dbstring)
+        other = self.alter("alter.add", {"a": {"type": "string"}})
+        other["schema"]["id"] = "other"
+        changes = [
+            self.alter("alter.add", {"a": {"type": "string"}}),
+            self.alter("alter.add", {"b": {"type": "string"}}),
+            other,
+            self.alter("alter.drop", {"a": {"type": "string"}}),
+        ]
+        steps = repository.plan_steps(changes)
+        self.assertEqual([name for name, step in steps], ["test", "other", "test"])
+        self.assertEqual(len(steps[0][1]), 1)
+        self.assertEqual(sorted(steps[0][1][0]["schema"]["properties"].keys()), 
+            ["a", "b"])
+            
+    def test_plan_steps_keeps_dependent_renames(self):
+        repository = DatabaseRepository(self.dbstring)
+        changes = [
+            self.alter("alter.rename", {"a": "b"}),
+            self.alter("alter.rename", {"b": "c"}),
+        ]
+        steps = repository.plan_steps(changes)
+        self.assertEqual(len(steps[0][1]), 2)
+        
+    def test_plan_steps_merges_modifies(self):
+        repository = DatabaseRepository(self.dbstring)
+        changes = [
+            self.alter("alter.modify", {"a": {"type": "string", "maxLength": 10}},
+                {"a": {"type": "string"}}),
+            self.alter("alter.modify", {"b": {"type": "string", "maxLength": 10}},
+                {"b": {"type": "string"}}),
+        ]
+        steps = repository.plan_steps(changes)
+        merged = steps[0][1]
+        self.assertEqual(len(merged), 1)
+        self.assertEqual(sorted(merged[0]["old_schema"]["properties"].keys()), 
+            ["a", "b"])
+        
+    def test_deploy_plan(self):
+        dbstring = self.dbstring
+        repository = DatabaseRepository(dbstring)
+        changes = [
+            {
+                "change": "create",
+                "schema": {
+                    "id": "test",
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "string", "maxLength": 40, "identity": True},
+                        "a": {"type": "string"},
+                        "b": {"type": "string"}
+                    }
+                }
+            },
+            self.alter("alter.add", {"c": {"type": "string"}}),
+            self.alter("alter.drop", {"a": {"type": "string"}}),
+            self.alter("alter.rename", {"b": "d"}),
+            self.alter("alter.modify", {"c": {"type": "string", "maxLength": 20}},
+                {"c": {"type": "string"}}),
+        ]
+        timings = repository.deploy_plan(changes)
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(timings[0]["table"], "test")
+        columns = self.reflect_columns(dbstring, "test")
+        self.assertEqual(sorted(columns.keys()), ["c", "d", "id"])
+        self.assertTrue(columns["id"].primary_key)
+        self.assertEqual(columns["c"].type.length, 20)
+        
+    def test_deploy_plan_instrumented(self):
+        repository = DatabaseRepository(self.dbstring)
+        collector = Collector().start()
+        try:
+            repository.deploy_plan([{
+                "change": "create",
+                "schema": {
+                    "id": "test",
+                    "type": "object",
+                    "properties": {"a": {"type": "string"}}
+                }
+            }, self.alter("alter.add", {"b": {"type": "string"}})])
+        finally:
+            collector.stop()
+        for name in ["DatabaseRepository.deploy_plan", 
+                "DatabaseRepository.deploy_step",
+                "DatabaseRepository.deploy_create",
+                "DatabaseRepository.deploy_alter_add"]:
+            self.assertTrue(name in collector.stats, name)
+        
+    def test_deploy_refreshes_cached_table(self):
+        repository = DatabaseRepository(self.dbstring)
+        repository.deploy({
+            "change": "create",
+            "schema": {
+                "id": "test",
+                "type": "object",
+                "properties": {"a": {"type": "string"}, "b": {"type": "string"}}
+            }
+        })
+        repository.deploy(self.alter("alter.rename", {"a": "c"}))
+        table = repository.database.table("test")
+        self.assertEqual(sorted(table.columns.keys()), ["b", "c"])
+        repository.deploy(self.alter("alter.drop", {"b": {"type": "string"}}))
+        self.assertEqual(list(table.columns.keys()), ["c"])
+        repository.deploy({"change": "drop", "schema": {"id": "test"}})
+        self.assertEqual(list(repository.database.table("test").columns), [])
+        
+    def test_deploy_plan_keeps_rows(self):
+        dbstring = self.dbstring
+        repository = DatabaseRepository(dbstring)
+        repository.deploy({
+            "change": "create",
+            "schema": {
+                "id": "test",
+                "type": "object",
+                "properties": {
+                    "a": {"type": "string"},
+                    "b": {"type": "string"}
+                }
+            }
+        })
+        engine = create_engine(dbstring)
+        engine.execute("INSERT INTO test (a, b) VALUES ('x', 'y')")
+        repository.deploy_plan([
+            self.alter("alter.drop", {"a": {"type": "string"}}),
+            self.alter("alter.rename", {"b": "c"}),
+        ])
+        rows = engine.execute("SELECT c FROM test").fetchall()
+        self.assertEqual([tuple(row) for row in rows], [("y", )])
+
+        
+    def create(self, table_name):
+        return {
+            "change": "create",
+            "schema": {
+                "id": table_name,
+                "type": "object",
+                "properties": {"a": {"type": "string"}}
+            }
+        }
+        
+    def add(self, table_name, name):
+        change = self.alter("alter.add", {name: {"type": "string"}})
+        change["schema"]["id"] = table_name
+        return change
+        
+    def test_plan_lanes_per_table(self):
+        repository = DatabaseRepository(self.dbstring)
+        steps = repository.plan_steps([
+            self.create("one"), self.create("two"), self.add("one", "b"),
+            self.add("three", "b"), self.add("two", "b")])
+        lanes = repository.plan_lanes(steps)
+        self.assertEqual(lanes, [[0, 2], [1, 4], [3]])
+        
+    def test_deploy_parallel(self):
+        repository = DatabaseRepository(self.dbstring, workers=3)
+        changes = []
+        for table_name in ["one", "two", "three", "four"]:
+            changes.append(self.create(table_name))
+        for table_name in ["one", "two", "three", "four"]:
+            changes.append(self.add(table_name, "b"))
+        steps = repository.plan_steps(changes)
+        timings = repository.deploy_parallel(steps, 
+            repository.plan_lanes(steps), 3)
+        self.assertEqual([timing["table"] for timing in timings], 
+            ["one", "two", "three", "four"] * 2)
+        for table_name in ["one", "two", "three", "four"]:
+            columns = self.reflect_columns(self.dbstring, table_name)
+            self.assertEqual(sorted(columns.keys()), ["a", "b"])
+            
+    def test_deploy_parallel_raises_first_error(self):
+        repository = DatabaseRepository(self.dbstring, workers=2)
+        steps = repository.plan_steps([self.add("missing", "b")])
+        self.assertRaises(Exception, repository.deploy_parallel, steps, 
+            repository.plan_lanes(steps), 2)
+            
+    def test_deploy_plan_serial_on_sqlite(self):
+        repository = DatabaseRepository(self.dbstring, workers=4)
+        collector = Collector().start()
+        try:
+            repository.deploy_plan([self.create("one"), self.create("two")])
+        finally:
+            collector.stop()
+        threads = set(event["thread"] for event in collector.events)
+        self.assertEqual(len(threads), 1)
+        self.assertTableExists(self.dbstring, "one")
+        self.assertTableExists(self.dbstring, "two")
+
+        
+    def setup_online_table(self, repository):
+        repository.deploy({
+            "change": "create",
+            "schema": {
+                "id": "test",
+                "type": "object",
+                "properties": {
+                    "id": {"type": "string", "maxLength": 10, "identity": True},
+                    "a": {"type": "string"}
+                }
+            }
+        })
+        engine = create_engine(self.dbstring)
+        for i in range(12):
+            engine.execute("INSERT INTO test (id, a) VALUES ('k%02d', 'value %d')" 
+                % (i, i))
+        return engine
+        
+    def test_deploy_online_modify(self):
+        reports = []
+        repository = DatabaseRepository(self.dbstring, online=True, 
+            chunk_size=5, progress=lambda progress: reports.append(progress.rows))
+        engine = self.setup_online_table(repository)
+        repository.deploy_plan([
+            self.alter("alter.modify", {"a": {"type": "string", "maxLength": 20}},
+                {"a": {"type": "string"}})
+        ])
+        self.assertEqual(reports, [5, 10, 12])
+        columns = self.reflect_columns(self.dbstring, "test")
+        self.assertEqual(sorted(columns.keys()), ["a", "id"])
+        self.assertEqual(columns["a"].type.length, 20)
+        rows = engine.execute("SELECT a FROM test WHERE id = 'k07'").fetchall()
+        self.assertEqual([tuple(row) for row in rows], [("value 7", )])
+        
+    def test_deploy_online_add_with_default(self):
+        repository = DatabaseRepository(self.dbstring, online=True, chunk_size=5)
+        engine = self.setup_online_table(repository)
+        repository.deploy_plan([
+            self.alter("alter.add", {"b": {"type": "string", "default": "x"}})
+        ])
+        rows = engine.execute("SELECT count(*) FROM test WHERE b = 'x'").scalar()
+        self.assertEqual(rows, 12)
+        
+    def test_offline_add_ignores_default(self):
+        repository = DatabaseRepository(self.dbstring)
+        engine = self.setup_online_table(repository)
+        repository.deploy_plan([
+            self.alter("alter.add", {"b": {"type": "string", "default": "x"}})
+        ])
+        rows = engine.execute("SELECT count(*) FROM test WHERE b IS NULL").scalar()
+        self.assertEqual(rows, 12)
+
+        
+    def setup_repository(self, commits):
+        repository = Repository(snapshot_interval=10)
+        repository.branch('master')
+        repository.commit('master', [{
+            "change": "create",
+            "schema": {"id": "test", "type": "object", "properties": {}}
+        }], 'created test')
+        for i in range(commits):
+            repository.commit('master', [
+                self.alter("alter.add", {"c%s" % i: {"type": "string"}})
+            ], 'added c%s' % i)
+        return repository
+        
+    def count_statements(self, engine):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, 
+                executemany):
+            statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', before_execute)
+        return statements
+        
+    def test_push_and_clone(self):
+        repository = self.setup_repository(25)
+        database_repository = DatabaseRepository(self.dbstring)
+        database_repository.initialize()
+        statements = self.count_statements(database_repository.database.engine)
+        written = database_repository.push(repository)
+        self.assertEqual(written, 26 + 26 + 2)
+        self.assertTrue(len(statements) <= 5, statements)
+        
+        clone = DatabaseRepository(self.dbstring)
+        statements = self.count_statements(clone.database.engine)
+        cloned = clone.clone()
+        master = cloned.checkout_branch('master')
+        self.assertEqual(master.commit_id, repository.branches['master'])
+        self.assertEqual(master.schema.tables, 
+            repository.checkout_branch('master').schema.tables)
+        self.assertEqual(len([statement for statement in statements 
+            if statement.startswith("SELECT")]), 1)
+            
+    def test_push_only_missing_objects(self):
+        repository = self.setup_repository(3)
+        database_repository = DatabaseRepository(self.dbstring)
+        database_repository.initialize()
+        database_repository.push(repository)
+        self.assertEqual(database_repository.push(repository), 0)
+        repository.commit('master', [
+            self.alter("alter.add", {"d": {"type": "string"}})
+        ], 'added d')
+        other = DatabaseRepository(self.dbstring)
+        self.assertEqual(other.push(repository, ['master']), 2)
+        self.assertEqual(other.clone().branches['master'], 
+            repository.branches['master'])
+        
+    def test_deploy_commit(self):
+        repository = self.setup_repository(2)
+        head = repository.branches['master']
+        database_repository = DatabaseRepository(self.dbstring)
+        database_repository.initialize()
+        self.assertEqual(database_repository.deployed_commit(), None)
+        timings = database_repository.deploy_commit(repository, head)
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(database_repository.deployed_commit(), head)
+        columns = self.reflect_columns(self.dbstring, "test")
+        self.assertEqual(sorted(columns.keys()), ["c0", "c1"])
+        
+        repository.commit('master', [
+            self.alter("alter.add", {"d": {"type": "string"}})
+        ], 'added d')
+        other = DatabaseRepository(self.dbstring)
+        timings = other.deploy_commit(repository, repository.branches['master'])
+        self.assertEqual([timing["changes"] for timing in timings], 
+            [["alter.add"]])
+        self.assertTrue("d" in self.reflect_columns(self.dbstring, "test"))
+        
+    def test_deploy_commit_checkpoints_parallel_lanes(self):
+        repository = self.setup_repository(1)
+        database_repository = DatabaseRepository(self.dbstring, workers=2)
+        database_repository.initialize()
+        database_repository.database.transactional_ddl_dialects = ['sqlite']
+        plans = []
+        def deploy_plan(changes, workers=None, commit_id=None, 
+                checkpoint=False, resume=False):
+            plans.append(checkpoint)
+            return []
+        database_repository.deploy_plan = deploy_plan
+        database_repository.deploy_commit(repository, 
+            repository.branches['master'])
+        database_repository.deploy_commit(repository, 
+            repository.branches['master'], workers=1)
+        self.assertEqual(plans, [True, False])
+        
+    def test_deploy_commit_up_to_date(self):
+        repository = self.setup_repository(2)
+        head = repository.branches['master']
+        database_repository = DatabaseRepository(self.dbstring)
+        database_repository.initialize()
+        database_repository.deploy_commit(repository, head)
+        other = DatabaseRepository(self.dbstring)
+        statements = self.count_statements(other.database.engine)
+        self.assertEqual(other.deploy_commit(repository, head), [])
+        self.assertEqual(len(statements), 1)
+        
+    def test_deploy_commit_without_repository(self):
+        repository = self.setup_repository(1)
+        database_repository = DatabaseRepository(self.dbstring)
+        self.assertRaises(RepositoryNotFound, database_repository.deploy_commit,
+            repository, repository.branches['master'])
+        
+    def test_deploy_plan_resume(self):
+        repository = DatabaseRepository(self.dbstring)
+        repository.initialize()
+        changes = [self.create("one"), self.create("two"), 
+            self.add("three", "b")]
+        self.assertRaises(Exception, repository.deploy_plan, changes, 
+            checkpoint=True)
+        self.assertTableExists(self.dbstring, "one")
+        self.assertTableExists(self.dbstring, "two")
+        plan_id = repository.plan_id(changes)
+        self.assertEqual(repository.completed_steps(plan_id, 3), set([0, 1]))
+        
+        repository.deploy(self.create("three"))
+        other = DatabaseRepository(self.dbstring)
+        timings = other.deploy_plan(changes, resume=True)
+        self.assertEqual([timing["table"] for timing in timings], ["three"])
+        self.assertEqual(sorted(self.reflect_columns(self.dbstring, 
+            "three").keys()), ["a", "b"])
+        self.assertEqual(other.completed_steps(plan_id, 3), set())
+        
+    def test_deploy_plan_step_commits_with_checkpoint(self):
+        repository = DatabaseRepository(self.dbstring)
+        repository.initialize()
+        changes = [self.create("one"), self.create("two")]
+        checkpoint_step = repository.checkpoint_step
+        def failing_checkpoint(plan_id, index, step):
+            if index == 1:
+                raise RuntimeError("checkpoint failed")
+            checkpoint_step(plan_id, index, step)
+        repository.checkpoint_step = failing_checkpoint
+        self.assertRaises(RuntimeError, repository.deploy_plan, changes, 
+            checkpoint=True)
+        self.assertTableExists(self.dbstring, "one")
+        self.assertTableDoesNotExist(self.dbstring, "two")
+        
+        other = DatabaseRepository(self.dbstring)
+        timings = other.deploy_plan(changes, resume=True)
+        self.assertEqual([timing["table"] for timing in timings], ["two"])
+        self.assertTableExists(self.dbstring, "two")
+        
+    def test_deploy_plan_checkpoint_resumes(self):
+        repository = DatabaseRepository(self.dbstring)
+        repository.initialize()
+        changes = [self.create("one"), self.add("two", "b")]
+        for i in range(2):
+            self.assertRaises(Exception, repository.deploy_plan, changes, 
+                checkpoint=True)
+        engine = create_engine(self.dbstring)
+        self.assertEqual(engine.execute("SELECT count(*) FROM _evolve "
+            "WHERE type = 'checkpoint'").scalar(), 1)
+        
+        repository.deploy(self.create("two"))
+        timings = repository.deploy_plan(changes, checkpoint=True)
+        self.assertEqual([timing["table"] for timing in timings], ["two"])
+        
+    def test_deploy_parallel_checkpoints_on_step_connection(self):
+        repository = DatabaseRepository(self.dbstring)
+        repository.initialize()
+        engine = create_engine(self.dbstring, poolclass=pool.QueuePool, 
+            pool_size=2, max_overflow=0, pool_timeout=1,
+            connect_args={"check_same_thread": False})
+        repository.database = Database(self.dbstring, engine=engine)
+        repository._storage = None
+        self.assertEqual(repository.deployed_commit(), None)
+        connections = {}
+        
+        def before_execute(connection, clauseelement, multiparams, params):
+            statement = str(clauseelement).strip().upper()
+            if statement.startswith("INSERT INTO _EVOLVE"):
+                key = "checkpoint"
+            elif statement.startswith("CREATE TABLE"):
+                key = "step"
+            else:
+                return
+            connections.setdefault(threading.current_thread(), []).append(
+                (key, connection.connection.connection))
+        event.listen(engine, "before_execute", before_execute)
+        
+        changes = [self.create("one"), self.create("two"), 
+            self.create("three")]
+        steps = repository.plan_steps(changes)
+        plan_id = repository.plan_id(changes)
+        timings = repository.deploy_parallel(steps, 
+            repository.plan_lanes(steps), 2, plan_id)
+        self.assertEqual(len(timings), 3)
+        self.assertEqual(repository.completed_steps(plan_id, 3), 
+            set([0, 1, 2]))
+        # in each thread a step is followed by its checkpoint, over the 
+        # connection the step ran on
+        for executed in connections.values():
+            self.assertEqual([key for key, connection in executed], 
+                ["step", "checkpoint"] * (len(executed) // 2))
+            for i in range(0, len(executed), 2):
+                self.assertTrue(executed[i][1] is executed[i + 1][1])
+        
+    def test_plan_id(self):
+        repository = DatabaseRepository(self.dbstring)
+        changes = [self.create("one")]
+        self.assertEqual(repository.plan_id(changes, "a"), 
+            repository.plan_id([self.create("one")], "a"))
+        self.assertNotEqual(repository.plan_id(changes, "a"), 
+            repository.plan_id(changes, "b"))
+        
+    def test_clone_without_repository(self):
+        repository = DatabaseRepository(self.dbstring)
+        self.assertRaises(RepositoryNotFound, repository.clone)
+        
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,6 +2,7 @@ import unittest
 from evolve.db import Database
 import os
 from sqlalchemy import *
+from sqlalchemy import event
 
 
 class TestDatabase(unittest.TestCase):
@@ -26,6 +27,73 @@ class TestDatabase(unittest.TestCase):
         table = self.db.table('table')
         self.assertEqual(['col1'], table.columns.keys())
 
+        
+    def count_queries(self):
+        statements = []
+        def before_execute(conn, cursor, statement, parameters, context, 
+                executemany):
+            statements.append(statement)
+        event.listen(self.db.engine, 'before_cursor_execute', before_execute)
+        return statements
+        
+    def test_table_is_reflected_once(self):
+        self.create_table()
+        self.db.forget('table')
+        statements = self.count_queries()
+        table = self.db.table('table')
+        reflected = len(statements)
+        self.assertTrue(reflected > 0)
+        self.assertTrue(self.db.table('table') is table)
+        self.assertEqual(len(statements), reflected)
+        
+    def test_missing_table_is_cached(self):
+        table = self.db.table('missing')
+        self.assertEqual(list(table.columns), [])
+        self.assertTrue(self.db.table('missing') is table)
+        
+    def test_prefetch(self):
+        self.create_table()
+        self.db.forget_all()
+        self.db.prefetch(['table', 'missing'])
+        statements = self.count_queries()
+        self.assertEqual(self.db.table('table').columns.keys(), ['col1'])
+        self.assertEqual(list(self.db.table('missing').columns), [])
+        self.assertEqual(statements, [])
+        
+    def test_forget(self):
+        self.create_table()
+        table = self.db.table('table')
+        self.db.forget('table')
+        self.assertFalse(self.db.table('table') is table)
+
+        
+    def test_ddl_keeps_plan_connection_open(self):
+        self.create_table()
+        with self.db.connect() as connection:
+            table = self.db.table('table')
+            self.db.add_columns(table, [Column('col2', UnicodeText())])
+            self.db.alter_column(table.c['col2'], name='col3')
+            self.assertFalse(connection.closed)
+            self.db.forget('table')
+            self.db.drop_columns(self.db.table('table'), ['col3'])
+            self.assertFalse(connection.closed)
+        self.db.forget('table')
+        self.assertEqual(self.db.table('table').columns.keys(), ['col1'])
+
+        
+    def test_rebuild_table_rolls_back(self):
+        self.create_table()
+        def before_execute(conn, cursor, statement, parameters, context, 
+                executemany):
+            if statement.startswith("ALTER TABLE"):
+                raise RuntimeError("rename failed")
+        event.listen(self.db.engine, 'before_cursor_execute', before_execute)
+        change = {"change": "alter.rename", 
+            "schema": {"id": "table", "properties": {"col1": "col2"}}}
+        self.assertRaises(RuntimeError, self.db.rebuild_table, 'table', 
+            [change])
+        self.assertEqual(sorted(self.db.engine.table_names()), ['table'])
+        self.assertEqual(self.db.table('table').columns.keys(), ['col1'])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,6 +2,9 @@ import unittest
 import os
 import shutil
 from evolve.file_repository import FileRepository
+from evolve.file_repository import FileStorage
+from evolve.object_store import ObjectStore
+from evolve.repository import Repository
 from evolve.exceptions import RepositoryAlreadyExists
 
 try:
@@ -100,6 +103,196 @@ class FileRepositoryTest(FileRepositoryTestCase):
         except RepositoryAlreadyExists, e:
             pass
         
+            
+            
+class FileRepositoryObjectsTest(FileRepositoryTestCase):
+    def setup_repository(self):
+        repository = Repository(snapshot_interval=1)
+        repository.branch('master')
+        changes = [{
+            "change":"create",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }]
+        repository.commit('master', changes, 'create person')
+        return repository
+        
+    def test_initialize_object_store(self):
+        repo = FileRepository()
+        repo.initialize(self.new_directory)
+        self.assertTrue(os.path.isdir('%s/objects' % self.new_directory))
+        
+    def test_save_and_load(self):
+        repository = self.setup_repository()
+        repo = FileRepository()
+        repo.save(self.existing_repository, repository)
+        loaded = repo.load(self.existing_repository)
+        self.assertEqual(loaded.branches, repository.branches)
+        self.assertEqual(loaded.commits, repository.commits)
+        self.assertEqual(loaded.changes, repository.changes)
+        self.assertEqual(loaded.snapshots, repository.snapshots)
+        master = loaded.checkout_branch('master')
+        self.assertTrue('person' in master.schema.tables)
+        
+    def test_save_writes_only_new_objects(self):
+        repository = self.setup_repository()
+        repo = FileRepository()
+        repo.save(self.existing_repository, repository)
+        store = ObjectStore(self.existing_repository)
+        self.assertFalse(store.put(repository.branches['master'], 'commit', {}))
+        
+    def test_pack(self):
+        repository = self.setup_repository()
+        repo = FileRepository()
+        repo.save(self.existing_repository, repository)
+        count = repo.pack(self.existing_repository)
+        self.assertEqual(count, 3)
+        store = ObjectStore(self.existing_repository)
+        self.assertEqual(store.loose_ids(), [])
+        self.assertEqual(repo.pack(self.existing_repository), 0)
+        loaded = repo.load(self.existing_repository)
+        self.assertEqual(loaded.commits, repository.commits)
+        
+    def test_ids_do_not_read_loose_objects(self):
+        repository = self.setup_repository()
+        FileRepository().save(self.existing_repository, repository)
+        store = ObjectStore(self.existing_repository)
+        read = []
+        get = store.get
+        def recording_get(object_id):
+            read.append(object_id)
+            return get(object_id)
+        store.get = recording_get
+        self.assertEqual(store.ids('commit'), 
+            set([repository.branches['master']]))
+        self.assertEqual(len(store.ids()), 3)
+        self.assertEqual(read, [])
+        
+    def test_pack_appends(self):
+        repository = self.setup_repository()
+        repo = FileRepository()
+        repo.save(self.existing_repository, repository)
+        repo.pack(self.existing_repository)
+        repository.commit('master', [{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "name":{"type":"string"}
+                }
+            }
+        }], 'add name')
+        repo.save(self.existing_repository, repository)
+        self.assertEqual(repo.pack(self.existing_repository), 3)
+        loaded = repo.load(self.existing_repository)
+        self.assertEqual(loaded.commits, repository.commits)
+        self.assertEqual(loaded.changes, repository.changes)
+        
+        
+        
+class RecordingStorage(FileStorage):
+    def __init__(self, directory):
+        FileStorage.__init__(self, directory)
+        self.fetched = []
+        
+    def get(self, _type, object_id):
+        self.fetched.append((_type, object_id))
+        return FileStorage.get(self, _type, object_id)
+        
+        
+class FileRepositoryLazyLoadTest(FileRepositoryTestCase):
+    def setup_repository(self, commits):
+        repository = Repository(snapshot_interval=4)
+        repository.branch('master')
+        repository.commit('master', [{
+            "change":"create",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }], 'create person')
+        for i in range(commits - 1):
+            repository.commit('master', [{
+                "change":"alter.add",
+                "schema":{
+                    "id":"person",
+                    "type":"object",
+                    "properties":{
+                        "name%s" % i:{"type":"string"}
+                    }
+                }
+            }], 'add name%s' % i)
+        FileRepository().save(self.existing_repository, repository)
+        return repository
+        
+    def test_load_is_lazy(self):
+        self.setup_repository(6)
+        storage = RecordingStorage(self.existing_repository)
+        repository = Repository(storage=storage)
+        self.assertEqual(storage.fetched, [])
+        
+    def test_checkout_reads_snapshot_and_tail(self):
+        original = self.setup_repository(6)
+        storage = RecordingStorage(self.existing_repository)
+        repository = Repository(storage=storage)
+        repository.branches.update(original.branches)
+        master = repository.checkout_branch('master')
+        self.assertEqual(len(master.schema.tables['person']['properties']), 6)
+        fetched_types = [_type for _type, object_id in storage.fetched]
+        # commits 6 and 5, the snapshot at commit 4 and the two changes after it
+        self.assertEqual(fetched_types.count('commit'), 2)
+        self.assertEqual(fetched_types.count('change'), 2)
+        
+    def test_commit_reads_snapshot_and_tail(self):
+        original = self.setup_repository(6)
+        storage = RecordingStorage(self.existing_repository)
+        repository = Repository(storage=storage, snapshot_interval=4)
+        repository.branches.update(original.branches)
+        repository.commit('master', [{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "age":{"type":"number"}
+                }
+            }
+        }], 'add age')
+        fetched_types = [_type for _type, object_id in storage.fetched]
+        # the depth of the new commit is read from its parent, commit 5 
+        # is not walked back to the root
+        self.assertEqual(fetched_types.count('commit'), 2)
+        head = repository.branches['master']
+        self.assertEqual(repository.commits[head]['depth'], 7)
+        
+    def test_commit_to_loaded_repository(self):
+        self.setup_repository(2)
+        repo = FileRepository()
+        repository = repo.load(self.existing_repository)
+        repository.commit('master', [{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "age":{"type":"number"}
+                }
+            }
+        }], 'add age')
+        repo.save(self.existing_repository, repository)
+        loaded = repo.load(self.existing_repository)
+        master = loaded.checkout_branch('master')
+        self.assertTrue('age' in master.schema.tables['person']['properties'])
+        
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+import unittest
+from evolve.graph import CommitGraph
+
+
+class CommitGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        # root - c1 - c2 - ... - c20
+        #              \
+        #               b3 - b4 - ... - b9
+        self.graph = CommitGraph()
+        self.graph.add('root')
+        parent = 'root'
+        for i in range(1, 21):
+            self.graph.add('c%s' % i, parent)
+            parent = 'c%s' % i
+        parent = 'c2'
+        for i in range(3, 10):
+            self.graph.add('b%s' % i, parent)
+            parent = 'b%s' % i
+
+
+class TestCommitGraph(CommitGraphTestCase):
+    def test_depth(self):
+        self.assertEqual(self.graph.depth('root'), 0)
+        self.assertEqual(self.graph.depth('c20'), 20)
+        self.assertEqual(self.graph.depth('b9'), 9)
+        
+    def test_ancestor_at_depth(self):
+        self.assertEqual(self.graph.ancestor_at_depth('c20', 13), 'c13')
+        self.assertEqual(self.graph.ancestor_at_depth('b9', 2), 'c2')
+        self.assertEqual(self.graph.ancestor_at_depth('c5', 6), None)
+        
+    def test_is_ancestor(self):
+        self.assertTrue(self.graph.is_ancestor('c2', 'b9'))
+        self.assertTrue(self.graph.is_ancestor('b9', 'b9'))
+        self.assertFalse(self.graph.is_ancestor('c3', 'b9'))
+        self.assertFalse(self.graph.is_ancestor('b9', 'c2'))
+        
+    def test_lowest_common_ancestor(self):
+        self.assertEqual(self.graph.lowest_common_ancestor('c20', 'b9'), 'c2')
+        self.assertEqual(self.graph.lowest_common_ancestor('b4', 'c17'), 'c2')
+        self.assertEqual(self.graph.lowest_common_ancestor('c7', 'c19'), 'c7')
+        self.assertEqual(self.graph.lowest_common_ancestor('c1', 'c1'), 'c1')
+        
+    def test_lowest_common_ancestor_exhaustive(self):
+        ids = list(self.graph.depths.keys())
+        for one in ids:
+            for two in ids:
+                expected = None
+                ancestors = set(self.graph.ancestors(two))
+                for commit_id in self.graph.ancestors(one):
+                    if commit_id in ancestors:
+                        expected = commit_id
+                self.assertEqual(
+                    self.graph.lowest_common_ancestor(one, two), expected)
+        
+    def test_lowest_common_ancestor_without_shared_root(self):
+        self.graph.add('other')
+        self.graph.add('o1', 'other')
+        self.assertEqual(self.graph.lowest_common_ancestor('o1', 'c3'), None)
+        
+    def test_ancestors(self):
+        self.assertEqual(self.graph.ancestors('b4'), 
+            ['root', 'c1', 'c2', 'b3', 'b4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from collections import OrderedDict
+from evolve.hashing import *
+from evolve.repository import Repository
+
+
+class HashingTests(unittest.TestCase):
+    def test_canonical_json_is_bytes(self):
+        self.assertTrue(isinstance(canonical_json({"a": 1}), bytes))
+        
+    def test_canonical_json_is_compact_and_sorted(self):
+        obj = OrderedDict([("b", [1, 2]), ("a", {"d": 1, "c": 2})])
+        self.assertEqual(canonical_json(obj), b'{"a":{"c":2,"d":1},"b":[1,2]}')
+        
+    def test_canonical_json_unicode(self):
+        self.assertEqual(canonical_json({"a": u"\u00e9"}), b'{"a":"\\u00e9"}')
+        
+    def test_change_id_ignores_key_order(self):
+        one = OrderedDict([("change", "create"), ("schema", {"id": "person"})])
+        two = OrderedDict([("schema", {"id": "person"}), ("change", "create")])
+        self.assertEqual(change_id(one), change_id(two))
+        
+    def test_commit_id(self):
+        base = commit_id('root', ['a', 'b'], 'msg')
+        self.assertEqual(base, commit_id(u'root', [u'a', u'b'], u'msg'))
+        self.assertNotEqual(base, commit_id('other', ['a', 'b'], 'msg'))
+        self.assertNotEqual(base, commit_id('root', ['b', 'a'], 'msg'))
+        self.assertNotEqual(base, commit_id('root', ['a', 'b'], 'other'))
+        self.assertNotEqual(base, commit_id(None, ['a', 'b'], 'msg'))
+        
+    def test_repository_ids_are_stable(self):
+        ids = []
+        for i in range(2):
+            repository = Repository()
+            repository.branch('master')
+            repository.commit('master', [{
+                "change":"create",
+                "schema":{
+                    "id":"person",
+                    "type":"object",
+                    "properties":{
+                        "id":{"type":"string"},
+                        "name":{"type":"string"}
+                    }
+                }
+            }], 'create person')
+            ids.append((repository.branches['master'], 
+                sorted(repository.changes.keys())))
+        self.assertEqual(ids[0], ids[1])
+        commit_dict = repository.commits[ids[0][0]]
+        self.assertEqual(ids[0][0], commit_id(commit_dict['parent'], 
+            commit_dict['changelog'], commit_dict['msg']))
+
+
+if __name__ == '__main__':
+    unittest.main()
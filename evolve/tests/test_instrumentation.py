@@ -0,0 +1,92 @@
+import unittest
+import os
+from evolve.instrumentation import *
+from evolve.repository import Repository
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+
+class InstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.collector = Collector().start()
+        
+    def tearDown(self):
+        self.collector.stop()
+        if os.path.exists('test_trace.json'):
+            os.remove('test_trace.json')
+            
+    def commit_person(self, repository):
+        repository.branch('master')
+        repository.commit('master', [{
+            "change":"create",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }], 'create person')
+
+
+class TestInstrumentation(InstrumentationTestCase):
+    def test_span_events(self):
+        events = []
+        subscribe(events.append)
+        try:
+            with span('operation', items=2) as timing:
+                timing.count('items')
+        finally:
+            unsubscribe(events.append)
+        self.assertEqual([event['phase'] for event in events], ['start', 'end'])
+        self.assertEqual(events[1]['counts'], {'items': 3})
+        self.assertTrue(events[1]['duration'] >= 0)
+        
+    def test_span_without_subscribers(self):
+        self.collector.stop()
+        self.assertTrue(span('operation') is null_span)
+        
+    def test_span_records_errors(self):
+        try:
+            with span('failing'):
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertTrue(self.collector.events[0]['error'])
+        
+    def test_repository_operations(self):
+        repository = Repository()
+        self.commit_person(repository)
+        repository.migrate(repository.branches['master'], 'root')
+        stats = self.collector.stats
+        for name in ['Repository.commit', 'Repository.checkout_commit', 
+                'Repository.materialize_schema', 'Repository.migrate', 
+                'Schema.add']:
+            self.assertTrue(name in stats, name)
+        self.assertEqual(stats['Repository.commit']['counts']['changes'], 1)
+        self.assertTrue(stats['Repository.commit']['counts']['bytes'] > 0)
+        self.assertEqual(stats['Repository.migrate']['counts']['changes'], 1)
+        
+    def test_report(self):
+        repository = Repository()
+        self.commit_person(repository)
+        report = self.collector.report()
+        self.assertTrue('Repository.commit' in report)
+        
+    def test_chrome_trace(self):
+        repository = Repository()
+        self.commit_person(repository)
+        self.collector.write_chrome_trace('test_trace.json')
+        f = open('test_trace.json')
+        trace = json.load(f)
+        f.close()
+        names = [event['name'] for event in trace['traceEvents']]
+        self.assertTrue('Repository.commit' in names)
+        self.assertEqual(trace['traceEvents'][0]['ph'], 'X')
+
+
+if __name__ == '__main__':
+    unittest.main()
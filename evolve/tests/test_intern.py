@@ -0,0 +1,49 @@
+import unittest
+import copy
+from evolve.intern import *
+
+
+class InternTests(unittest.TestCase):
+    def setUp(self):
+        self.interner = Interner()
+        
+    def test_frozen_dict_is_immutable(self):
+        frozen = self.interner.intern({"a": {"b": 1}})
+        self.assertRaises(TypeError, frozen.__setitem__, "a", 2)
+        self.assertRaises(TypeError, frozen["a"].update, {"c": 3})
+        self.assertRaises(TypeError, frozen.pop, "a")
+        
+    def test_deepcopy_is_mutable(self):
+        frozen = self.interner.intern({"a": {"b": 1}})
+        copied = copy.deepcopy(frozen)
+        copied["a"]["b"] = 2
+        self.assertEqual(frozen["a"]["b"], 1)
+        self.assertEqual(type(copied), dict)
+        
+    def test_equal_objects_are_shared(self):
+        one = self.interner.intern({"schema": {"properties": {"id": {"type": "string"}}}})
+        two = self.interner.intern({"other": {"type": "string"}})
+        self.assertTrue(one["schema"]["properties"]["id"] is two["other"])
+        
+    def test_intern_equal_dicts(self):
+        one = self.interner.intern({"a": 1, "b": [1, {"c": 2}]})
+        two = self.interner.intern({"b": [1, {"c": 2}], "a": 1})
+        self.assertTrue(one is two)
+        self.assertEqual(one, {"a": 1, "b": [1, {"c": 2}]})
+
+        
+    def test_keys_are_digests(self):
+        self.interner.intern({"a": {"b": "x" * 1000}, "c": [{"d": 1}]})
+        self.assertEqual(len(self.interner), 3)
+        for key in self.interner.objects:
+            self.assertEqual(len(key), 20)
+            
+    def test_types_are_distinguished(self):
+        one = self.interner.intern({"a": 1})
+        two = self.interner.intern({"a": "1"})
+        three = self.interner.intern({"a": [1]})
+        self.assertFalse(one is two)
+        self.assertFalse(one is three)
+
+if __name__ == '__main__':
+    unittest.main()
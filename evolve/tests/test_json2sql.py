@@ -0,0 +1,45 @@
+import unittest
+from evolve.json2sql import *
+from sqlalchemy import *
+
+
+class TestColumnType(unittest.TestCase):
+    def test_string(self):
+        self.assertTrue(isinstance(column_type({"type": "string"}), UnicodeText))
+        _type = column_type({"type": "string", "maxLength": 40})
+        self.assertTrue(isinstance(_type, Unicode))
+        self.assertEqual(_type.length, 40)
+        
+    def test_formats(self):
+        self.assertTrue(isinstance(
+            column_type({"type": "string", "format": "date"}), Date))
+        self.assertTrue(isinstance(
+            column_type({"type": "string", "format": "date-time"}), DateTime))
+        _type = column_type({"type": "string", "format": "email", "maxLength": 80})
+        self.assertEqual(_type.length, 80)
+        
+    def test_types(self):
+        self.assertTrue(isinstance(column_type({"type": "number"}), Float))
+        self.assertTrue(isinstance(column_type({"type": "integer"}), Integer))
+        self.assertTrue(isinstance(column_type({"type": "boolean"}), Boolean))
+        self.assertTrue(isinstance(column_type({"type": "object"}), UnicodeText))
+        self.assertTrue(isinstance(column_type({"type": "array"}), UnicodeText))
+        
+    def test_unknown_type(self):
+        self.assertRaises(ValueError, column_type, {"type": "any"})
+        
+    def test_same_signature_shares_type(self):
+        one = column_type({"type": "string", "maxLength": 20, "required": True})
+        two = column_type({"type": "string", "maxLength": 20, "pattern": "^a"})
+        self.assertTrue(one is two)
+        self.assertEqual(signature({"type": "integer", "maxLength": 3}), 
+            ("integer", None, None))
+        
+    def test_converter(self):
+        converter = JSONSchemaTypeToSQLColumnType()
+        converter.set_prop({"type": "boolean"})
+        self.assertTrue(isinstance(converter.get_column_type(), Boolean))
+
+
+if __name__ == '__main__':
+    unittest.main()
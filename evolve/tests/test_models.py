@@ -1,5 +1,7 @@
 import unittest
 from evolve.models import Models
+from evolve.repository import Repository
+from sqlalchemy.orm import sessionmaker
 from evolve.db import Database
 import os
 from sqlalchemy import *
@@ -59,6 +61,80 @@ class TestModels(unittest.TestCase):
         person = self.build_person()
         self.assertFalse(hasattr(person, 'other'))
 
+        
+    def test_build_is_memoized(self):
+        person = self.build_person()
+        other = Models('sqlite:///test_database.db', dict(self.schema))
+        other.build()
+        self.assertTrue(other.models['person'] is person)
+        
+    def test_build_does_not_reflect(self):
+        models = Models('sqlite:///missing.db', {
+            "pet": {
+                "id": "pet",
+                "type": "object",
+                "properties": {"name": {"type": "string", "maxLength": 20}}
+            }
+        })
+        models.build()
+        self.assertFalse(os.path.exists('missing.db'))
+        self.assertTrue(hasattr(models.models['pet'], 'name'))
+        
+    def test_query(self):
+        person = self.build_person()
+        session = sessionmaker(bind=self.models.database.engine)()
+        instance = person()
+        instance.id = u'p1'
+        instance.name = u'Ada'
+        session.add(instance)
+        session.commit()
+        self.assertEqual(session.query(person).one().name, 'Ada')
+        
+    def test_rebuild_only_changed_tables(self):
+        self.schema["pet"] = {
+            "id": "pet",
+            "type": "object",
+            "properties": {"id": {"type": "string", "identity": True}}
+        }
+        self.models.build()
+        person = self.models.models['person']
+        pet = self.models.models['pet']
+        schema = dict(self.schema)
+        schema["pet"] = {
+            "id": "pet",
+            "type": "object",
+            "properties": {
+                "id": {"type": "string", "identity": True},
+                "age": {"type": "number"}
+            }
+        }
+        self.models.rebuild(schema, changed=set(["pet"]))
+        self.assertTrue(self.models.models['person'] is person)
+        self.assertFalse(self.models.models['pet'] is pet)
+        self.assertTrue(hasattr(self.models.models['pet'], 'age'))
+        
+    def test_checkout(self):
+        repo = Repository()
+        repo.branch('master')
+        repo.commit('master', [{"change": "create", "schema": self.schema["person"]}],
+            'person')
+        first = repo.checkout_branch('master').commit_id
+        repo.commit('master', [{
+            "change": "create",
+            "schema": {
+                "id": "pet", 
+                "type": "object", 
+                "properties": {"name": {"type": "string"}}
+            }
+        }], 'pet')
+        second = repo.checkout_branch('master').commit_id
+        self.models.checkout(repo, first)
+        person = self.models.models['person']
+        self.models.checkout(repo, second)
+        self.assertEqual(sorted(self.models.models.keys()), ['person', 'pet'])
+        self.assertTrue(self.models.models['person'] is person)
+        self.assertEqual(self.models.key, second)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
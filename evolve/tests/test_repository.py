@@ -1,4 +1,5 @@
 import unittest
+import copy
 from evolve.repository import *
 from evolve.tests import reversible_changes
 
@@ -127,12 +128,150 @@ class TestEvolveRepositoryCommit(EvolveRepositoryTestCase):
         person_props = master.schema.tables['person']['properties'].keys()
         self.assertTrue('id' in person_props)
         
+    def test_commit_invalid_change(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.branches['master']
+        changes = [{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "id":{"type":"string"}
+                }
+            }
+        }]
+        try:
+            self.repo.commit('master', changes, 'add id again')
+            self.fail('Expected commit() to raise InvalidChange')
+        except InvalidChange:
+            pass
+        self.assertEqual(self.repo.branches['master'], master)
+        
+    def test_committed_changes_are_immutable(self):
+        self.commit_person_to_master_branch()
+        change = list(self.repo.changes.values())[0]
+        self.assertRaises(TypeError, change.__setitem__, 'change', 'drop')
+        
+    def test_committed_changes_share_equal_parts(self):
+        self.setup_repo_with_two_branches()
+        self.repo.branch('b3', 'master')
+        self.repo.commit('b3', [{
+            "change":"alter.add",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "name":{"type":"string"}
+                }
+            }
+        }], 'added name field again')
+        b1 = self.repo.checkout_branch('b1')
+        b3 = self.repo.checkout_branch('b3')
+        self.assertEqual(b1.changelog, b3.changelog)
+        self.assertTrue(b1.schema.tables['person']['properties']['id'] is 
+            b3.schema.tables['person']['properties']['id'])
+        
+    def test_checkout_does_not_add_old_schema(self):
+        self.setup_repo_with_two_branches()
+        self.repo.snapshot_cache.clear()
+        self.repo.checkout_branch('b1')
+        for change in self.repo.changes.values():
+            self.assertFalse('old_schema' in change)
+        
     def test_commit_msg(self):
         self.commit_person_to_master_branch()
         master = self.repo.checkout_branch('master')
         self.assertEqual(master.msg, 'create person')
     
     
+class TestEvolveRepositorySnapshots(EvolveRepositoryTestCase):
+    def commit_names(self, count):
+        for i in range(count):
+            changes = [{
+                "change":"alter.add",
+                "schema":{
+                    "id":"person",
+                    "type":"object",
+                    "properties":{
+                        "name%s" % i:{"type":"string"}
+                    }
+                }
+            }]
+            self.repo.commit('master', changes, 'added name%s' % i)
+            
+    def test_checkout_caches_snapshot(self):
+        self.commit_person_to_master_branch()
+        self.repo.snapshot_cache.clear()
+        master = self.repo.checkout_branch('master')
+        self.assertTrue(master.commit_id in self.repo.snapshot_cache)
+        
+    def test_snapshot_is_not_shared_with_checkout(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.checkout_branch('master')
+        del master.schema.tables['person']
+        master1 = self.repo.checkout_branch('master')
+        self.assertTrue('person' in master1.schema.tables)
+        
+    def test_snapshot_cache_is_bounded(self):
+        self.repo = Repository(cache_size=2)
+        self.commit_person_to_master_branch()
+        self.commit_names(5)
+        self.assertEqual(len(self.repo.snapshot_cache), 2)
+        
+    def test_persisted_snapshots(self):
+        self.repo = Repository(snapshot_interval=2)
+        self.commit_person_to_master_branch()
+        self.commit_names(3)
+        self.assertEqual(len(self.repo.snapshots), 2)
+        
+    def test_checkout_from_persisted_snapshot(self):
+        self.repo = Repository(cache_size=0, snapshot_interval=2)
+        self.commit_person_to_master_branch()
+        self.commit_names(3)
+        master = self.repo.checkout_branch('master')
+        props = master.schema.tables['person']['properties']
+        self.assertEqual(sorted(props.keys()), 
+            ['id', 'name0', 'name1', 'name2'])
+        
+    def test_replay_does_not_modify_changes(self):
+        self.repo = Repository(cache_size=0)
+        self.commit_person_to_master_branch()
+        self.commit_names(1)
+        self.repo.checkout_branch('master')
+        for change in self.repo.changes.values():
+            if change['change'] == 'create':
+                self.assertEqual(list(change['schema']['properties'].keys()), ['id'])
+        
+    def test_parent_schema_is_lazy(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.checkout_branch('master')
+        self.assertEqual(master.parent.schema.tables, {})
+    
+    
+class TestEvolveRepositoryRecordValidator(EvolveRepositoryTestCase):
+    def test_record_validator(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.branches['master']
+        validator = self.repo.record_validator(master, 'person')
+        self.assertEqual(validator.errors({"id": 1}), 
+            [("id", "is not of type string")])
+        
+    def test_record_validator_is_cached(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.branches['master']
+        validator = self.repo.record_validator(master, 'person')
+        self.assertTrue(self.repo.record_validator(master, 'person') is validator)
+        
+    def test_record_validator_table_not_found(self):
+        self.commit_person_to_master_branch()
+        try:
+            self.repo.record_validator(self.repo.branches['master'], 'pet')
+            self.fail('Expected record_validator() to raise TableNotFound')
+        except TableNotFound:
+            pass
+    
+    
 class TestEvolveRepositoryRevChange(EvolveRepositoryTestCase):
     def compare_rev_changes(self, change, rev_change):
         rev_change1 = self.repo.rev_change(change)
@@ -178,6 +317,39 @@ class TestEvolveRepositoryFindCommonParent(EvolveRepositoryTestCase):
         self.assertEqual(parent_id, master.commit_id)
 
 
+    def test_find_common_parent_of_ancestor(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        master = self.repo.checkout_branch('master')
+        parent_id = self.repo.find_common_parent(master.commit_id, b1.commit_id)
+        self.assertEqual(parent_id, master.commit_id)
+        
+    def test_find_common_parent_commit_not_found(self):
+        try:
+            self.repo.find_common_parent('root', 'does_not_exist')
+            self.fail('Expected find_common_parent() to raise CommitNotFound')
+        except CommitNotFound:
+            pass
+            
+    def test_find_common_parent_no_common_parent(self):
+        self.repo.commits['other'] = {'changelog': [], 'msg': 'other'}
+        try:
+            self.repo.find_common_parent('root', 'other')
+            self.fail('Expected find_common_parent() to raise NoCommonParent')
+        except NoCommonParent:
+            pass
+            
+    def test_find_common_parent_deep_history(self):
+        self.commit_person_to_master_branch()
+        for i in range(1500):
+            self.repo.commits['c%s' % i] = {
+                'changelog': [], 'msg': 'c%s' % i, 
+                'parent': self.repo.branches['master']}
+            self.repo.branches['master'] = 'c%s' % i
+        master = self.repo.branches['master']
+        self.assertEqual(self.repo.find_common_parent(master, 'c700'), 'c700')
+
+
 class TestEvolveRepositoryRollback(EvolveRepositoryTestCase):
     def test_rollback(self):
         self.setup_repo_with_two_branches()
@@ -188,7 +360,41 @@ class TestEvolveRepositoryRollback(EvolveRepositoryTestCase):
         self.assertTrue(log[0]['change'] == 'alter.drop')
         self.assertTrue('name' in log[0]['schema']['properties'].keys())
 
+    def test_rollback_multiple_commits(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        log = self.repo.rollback(b1.commit_id, 'root')
+        self.assertEqual([change['change'] for change in log], 
+            ['alter.drop', 'drop'])
+            
+    def test_rollback_to_self(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.checkout_branch('master')
+        try:
+            self.repo.rollback(master.commit_id, master.commit_id)
+            self.fail('Expected rollback() to raise InvalidChange')
+        except InvalidChange:
+            pass
+            
+    def test_rollback_to_non_ancestor(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        b2 = self.repo.checkout_branch('b2')
+        try:
+            self.repo.rollback(b1.commit_id, b2.commit_id)
+            self.fail('Expected rollback() to raise CommitNotFound')
+        except CommitNotFound:
+            pass
+    
+    
 class TestEvolveRepositoryRollforward(EvolveRepositoryTestCase):
+    def test_rollforward_multiple_commits(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        log = self.repo.rollforward('root', b1.commit_id)
+        self.assertEqual([change['change'] for change in log], 
+            ['create', 'alter.add'])
+            
     def test_rollforward(self):
         self.setup_repo_with_two_branches()
         b1 = self.repo.checkout_branch('b1')
@@ -210,6 +416,96 @@ class TestEvolveRepositoryMigrate(EvolveRepositoryTestCase):
         self.assertTrue(migration[1]['change'] == 'alter.add')
         self.assertTrue('last_name' in migration[1]['schema']['properties'])
         
+    def test_migrate_from_ancestor(self):
+        self.setup_repo_with_two_branches()
+        master = self.repo.checkout_branch('master')
+        b1 = self.repo.checkout_branch('b1')
+        migration = self.repo.migrate(master.commit_id, b1.commit_id)
+        self.assertEqual(len(migration), 1)
+        self.assertEqual(migration[0]['change'], 'alter.add')
+        
+    def test_sql_plan(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        b2 = self.repo.checkout_branch('b2')
+        statements = self.repo.sql_plan(b1.commit_id, b2.commit_id, 'postgresql')
+        self.assertEqual([statement.change for statement in statements], 
+            ['alter.drop', 'alter.add'])
+        self.assertTrue('DROP COLUMN name' in statements[0].sql)
+        
+    def test_migrate_to_self(self):
+        self.commit_person_to_master_branch()
+        master = self.repo.checkout_branch('master')
+        self.assertEqual(self.repo.migrate(master.commit_id, master.commit_id), [])
+        
+    def test_migrate_compact(self):
+        self.setup_repo_with_two_branches()
+        self.repo.branch('b3', 'b1')
+        changes = [{
+            "change":"alter.drop",
+            "schema":{
+                "id":"person",
+                "type":"object",
+                "properties":{
+                    "name":{}
+                }
+            }
+        }]
+        self.repo.commit('b3', changes, 'dropped name field')
+        master = self.repo.checkout_branch('master')
+        b3 = self.repo.checkout_branch('b3')
+        migration = self.repo.migrate(master.commit_id, b3.commit_id)
+        self.assertEqual(len(migration), 2)
+        migration = self.repo.migrate(master.commit_id, b3.commit_id, compact=True)
+        self.assertEqual(migration, [])
+        
+    def test_diff(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        b2 = self.repo.checkout_branch('b2')
+        diff = self.repo.diff(b1.commit_id, b2.commit_id)
+        schema = b1.schema.copy()
+        for change in copy.deepcopy(diff):
+            schema.add(change)
+        self.assertEqual(schema.tables, b2.schema.tables)
+        self.assertEqual(self.repo.diff(b1.commit_id, b1.commit_id), [])
+        
+    def test_diff_only_changed_tables(self):
+        self.setup_repo_with_two_branches()
+        self.repo.branch('b3', 'b1')
+        self.repo.commit('b3', [{
+            "change": "create",
+            "schema": {
+                "id": "pet",
+                "type": "object",
+                "properties": {"name": {"type": "string"}}
+            }
+        }], 'added pet')
+        self.repo.commit('b3', [{
+            "change": "alter.add",
+            "schema": {
+                "id": "pet",
+                "type": "object",
+                "properties": {"age": {"type": "number"}}
+            }
+        }], 'added age')
+        b1 = self.repo.checkout_branch('b1')
+        b3 = self.repo.checkout_branch('b3')
+        diff = self.repo.diff(b1.commit_id, b3.commit_id)
+        self.assertEqual(len(diff), 1)
+        self.assertEqual(diff[0]['change'], 'create')
+        self.assertEqual(sorted(diff[0]['schema']['properties'].keys()), 
+            ['age', 'name'])
+        
+    def test_iter_migrate(self):
+        self.setup_repo_with_two_branches()
+        b1 = self.repo.checkout_branch('b1')
+        b2 = self.repo.checkout_branch('b2')
+        migration = self.repo.iter_migrate(b1.commit_id, b2.commit_id)
+        self.assertEqual(next(migration)['change'], 'alter.drop')
+        self.assertEqual(next(migration)['change'], 'alter.add')
+        self.assertRaises(StopIteration, next, migration)
+        
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
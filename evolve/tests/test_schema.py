@@ -1,4 +1,5 @@
 import unittest
+import copy
 from evolve.schema import *
 from evolve.tests import non_reversible_changes
 from evolve.tests import reversible_changes
@@ -77,4 +78,105 @@ class EvolveSchemaMakeChangesReversible(EvolveSchemaTestCase):
         rev = reversible_changes.alter_rename
         non_rev = non_reversible_changes.alter_rename
         result = self.schema.make_change_reversible(non_rev)
-        self.assertEqual(result, rev)
\ No newline at end of file
+        self.assertEqual(result, rev)
+
+class EvolveSchemaCopy(EvolveSchemaTestCase):
+    def setup_two_tables(self):
+        self.setup_schema_for_alter_drop_alter_modify_alter_rename()
+        self.schema.tables['pet'] = {
+            "id":"pet",
+            "type":"object",
+            "properties":{
+                "id": {"type":"string"}
+            }
+        }
+        
+    def test_copy_shares_tables(self):
+        self.setup_two_tables()
+        copied = self.schema.copy()
+        self.assertTrue(copied.tables['person'] is self.schema.tables['person'])
+        
+    def test_add_shares_unchanged_tables(self):
+        self.setup_two_tables()
+        copied = self.schema.copy()
+        copied.add(copy.deepcopy(reversible_changes.alter_add))
+        self.assertTrue(copied.tables['pet'] is self.schema.tables['pet'])
+        self.assertFalse(copied.tables['person'] is self.schema.tables['person'])
+        
+    def test_add_does_not_modify_copied_schema(self):
+        self.setup_two_tables()
+        copied = self.schema.copy()
+        copied.add(copy.deepcopy(reversible_changes.alter_drop))
+        copied.add(copy.deepcopy(reversible_changes.alter_modify))
+        copied.add(copy.deepcopy(reversible_changes.alter_rename))
+        self.assertEqual(sorted(self.schema.tables['person']['properties'].keys()), 
+            ['id', 'name'])
+        self.assertEqual(sorted(copied.tables['person']['properties'].keys()), 
+            ['new_id'])
+            
+    def test_add_does_not_modify_create_change(self):
+        change = copy.deepcopy(reversible_changes.create)
+        self.schema.add(change)
+        self.schema.add(copy.deepcopy(reversible_changes.alter_add))
+        self.assertEqual(list(change['schema']['properties'].keys()), ['id'])
+
+
+class EvolveSchemaVerifyBatch(EvolveSchemaTestCase):
+    def test_valid_changes(self):
+        changes = [
+            copy.deepcopy(reversible_changes.create),
+            copy.deepcopy(reversible_changes.alter_add),
+            copy.deepcopy(reversible_changes.alter_rename),
+            copy.deepcopy(reversible_changes.alter_drop),
+            copy.deepcopy(reversible_changes.alter_rename_reversed),
+        ]
+        self.assertEqual(self.schema.verify_batch(changes), [])
+        
+    def test_changes_see_earlier_changes(self):
+        self.setup_schema_for_alter_add()
+        changes = [
+            copy.deepcopy(reversible_changes.alter_add),
+            copy.deepcopy(reversible_changes.alter_add),
+        ]
+        violations = self.schema.verify_batch(changes)
+        self.assertEqual(len(violations), 1)
+        self.assertEqual(violations[0]['index'], 1)
+        self.assertEqual(violations[0]['field'], 'name')
+        
+    def test_reports_every_violation(self):
+        changes = [
+            copy.deepcopy(reversible_changes.alter_add),
+            copy.deepcopy(reversible_changes.create),
+            copy.deepcopy(reversible_changes.create),
+            copy.deepcopy(reversible_changes.alter_drop),
+            {"change": "alter.unknown", "schema": {"id": "person"}},
+        ]
+        violations = self.schema.verify_batch(changes)
+        self.assertEqual([violation['index'] for violation in violations], 
+            [0, 2, 3, 4])
+            
+    def test_dropped_table(self):
+        self.setup_schema_for_drop()
+        changes = [
+            copy.deepcopy(non_reversible_changes.drop),
+            copy.deepcopy(reversible_changes.alter_modify),
+        ]
+        violations = self.schema.verify_batch(changes)
+        self.assertEqual(len(violations), 1)
+        self.assertEqual(violations[0]['table'], 'person')
+        
+    def test_rename_to_existing_field(self):
+        self.setup_schema_for_alter_drop_alter_modify_alter_rename()
+        change = copy.deepcopy(reversible_changes.alter_rename)
+        change['schema']['properties'] = {"id": "name"}
+        violations = self.schema.verify_batch([change])
+        self.assertEqual(violations[0]['field'], 'name')
+        
+    def test_does_not_modify_schema(self):
+        self.setup_schema_for_alter_add()
+        tables = copy.deepcopy(self.schema.tables)
+        self.schema.verify_batch([
+            copy.deepcopy(reversible_changes.alter_add),
+            copy.deepcopy(non_reversible_changes.drop),
+        ])
+        self.assertEqual(self.schema.tables, tables)
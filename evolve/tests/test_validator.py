@@ -0,0 +1,97 @@
+import unittest
+from evolve.validator import *
+
+
+class RecordValidatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.schema = {
+            "id": "person",
+            "type": "object",
+            "properties": {
+                "id": {"type": "string", "maxLength": 40, "identity": True},
+                "name": {"type": "string", "maxLength": 5},
+                "age": {"type": "integer", "minimum": 0},
+                "height": {"type": "number"},
+                "active": {"type": "boolean"},
+                "born": {"type": "string", "format": "date"},
+                "seen": {"type": "string", "format": "date-time"},
+                "kind": {"type": "string", "enum": ["a", "b"]},
+                "tags": {"type": "array"},
+                "extra": {"type": "object"}
+            }
+        }
+        self.validator = RecordValidator(self.schema)
+        
+    def valid_record(self):
+        return {
+            "id": "1",
+            "name": "ann",
+            "age": 30,
+            "height": 1.7,
+            "active": True,
+            "born": "1980-01-31",
+            "seen": "2011-05-01T10:00:00Z",
+            "kind": "a",
+            "tags": ["x"],
+            "extra": {}
+        }
+
+
+class TestRecordValidator(RecordValidatorTestCase):
+    def test_valid_record(self):
+        self.assertEqual(self.validator.errors(self.valid_record()), [])
+        
+    def test_missing_optional_fields(self):
+        self.assertEqual(self.validator.errors({"id": "1"}), [])
+        
+    def test_missing_identity(self):
+        self.assertEqual(self.validator.errors({}), [("id", "is required")])
+        
+    def test_errors(self):
+        record = self.valid_record()
+        record.update({
+            "name": "too long",
+            "age": -1,
+            "height": "tall",
+            "active": 1,
+            "born": "1980-02-31",
+            "seen": "yesterday",
+            "kind": "c",
+            "tags": {},
+        })
+        fields = sorted([field for field, message in self.validator.errors(record)])
+        self.assertEqual(fields, 
+            ["active", "age", "born", "height", "kind", "name", "seen", "tags"])
+            
+    def test_bool_is_not_a_number(self):
+        record = self.valid_record()
+        record["age"] = True
+        self.assertEqual(self.validator.errors(record), 
+            [("age", "is not of type integer")])
+            
+    def test_additional_properties(self):
+        self.schema["additionalProperties"] = False
+        validator = RecordValidator(self.schema)
+        record = self.valid_record()
+        record["other"] = 1
+        self.assertEqual(validator.errors(record), 
+            [("other", "is not a property of person")])
+            
+    def test_iter_errors(self):
+        records = iter([self.valid_record(), {"id": "2", "age": "x"}, {}])
+        errors = list(self.validator.iter_errors(records))
+        self.assertEqual(errors, 
+            [(1, "age", "is not of type integer"), (2, "id", "is required")])
+            
+    def test_iter_column_errors(self):
+        columns = {
+            "id": ["1", "2", None],
+            "age": [1, "x", 3]
+        }
+        errors = sorted(self.validator.iter_column_errors(columns))
+        self.assertEqual(errors, 
+            [(1, "age", "is not of type integer"), (2, "id", "is required")])
+
+
+if __name__ == '__main__':
+    unittest.main()
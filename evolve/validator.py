@@ -0,0 +1,187 @@
+import datetime
+import re
+
+try:
+    string_types = basestring
+    integer_types = (int, long)
+except NameError:
+    string_types = str
+    integer_types = (int, )
+
+
+def is_date(value):
+    try:
+        datetime.datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def is_time(value):
+    try:
+        datetime.datetime.strptime(value.split('.')[0], '%H:%M:%S')
+        return True
+    except ValueError:
+        return False
+
+
+def is_date_time(value):
+    value = re.sub(r'(Z|[+-]\d\d:?\d\d)$', '', value)
+    value = value.split('.')[0]
+    try:
+        datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+        return True
+    except ValueError:
+        return False
+
+
+class RecordValidator(object):
+    """Validate records against the JSON schema of a table.
+
+    Every property is compiled once into a check function that only runs
+    the tests its schema asks for, so validating a record is a loop over
+    precompiled callables rather than a walk over the schema.
+    """
+    types = {
+        'string': lambda value: isinstance(value, string_types),
+        'number': lambda value: (isinstance(value, integer_types + (float, ))
+            and not isinstance(value, bool)),
+        'integer': lambda value: (isinstance(value, integer_types)
+            and not isinstance(value, bool)),
+        'boolean': lambda value: isinstance(value, bool),
+        'object': lambda value: isinstance(value, dict),
+        'array': lambda value: isinstance(value, (list, tuple)),
+    }
+
+    formats = {
+        'date': is_date,
+        'time': is_time,
+        'date-time': is_date_time,
+    }
+
+    def __init__(self, table_schema):
+        self.table = table_schema['id']
+        properties = table_schema.get('properties', {})
+        self.checks = []
+        for name, prop in properties.items():
+            self.checks.append((name, self.compile_property(prop)))
+        self.check_map = dict(self.checks)
+        if table_schema.get('additionalProperties') is False:
+            self.allowed = set(properties)
+        else:
+            self.allowed = None
+
+    def compile_property(self, prop):
+        """Return a function of a value returning an error message or None"""
+        tests = []
+        _type = prop.get('type')
+        if _type in self.types:
+            type_test = self.types[_type]
+            tests.append((type_test, "is not of type %s" % _type))
+
+        if 'enum' in prop:
+            enum = prop['enum']
+            tests.append((lambda value: value in enum,
+                "is not one of %s" % (enum, )))
+
+        if _type == 'string':
+            if 'maxLength' in prop and prop['maxLength']:
+                max_length = prop['maxLength']
+                tests.append((lambda value: len(value) <= max_length,
+                    "is longer than %s" % max_length))
+            if 'minLength' in prop:
+                min_length = prop['minLength']
+                tests.append((lambda value: len(value) >= min_length,
+                    "is shorter than %s" % min_length))
+            if 'pattern' in prop:
+                pattern = re.compile(prop['pattern'])
+                tests.append((lambda value: pattern.search(value) is not None,
+                    "does not match %s" % prop['pattern']))
+            if prop.get('format') in self.formats:
+                format_test = self.formats[prop['format']]
+                tests.append((format_test, "is not a valid %s" % prop['format']))
+
+        if _type in ('number', 'integer'):
+            if 'minimum' in prop:
+                minimum = prop['minimum']
+                tests.append((lambda value: value >= minimum,
+                    "is less than %s" % minimum))
+            if 'maximum' in prop:
+                maximum = prop['maximum']
+                tests.append((lambda value: value <= maximum,
+                    "is greater than %s" % maximum))
+
+        required = prop.get('required') or prop.get('identity')
+
+        def check(value):
+            if value is None:
+                if required:
+                    return "is required"
+                return None
+            for test, message in tests:
+                if not test(value):
+                    return message
+            return None
+
+        return check
+
+    def errors(self, record):
+        """Return the (field, message) errors of a single record"""
+        errors = []
+        for name, check in self.checks:
+            message = check(record.get(name))
+            if message:
+                errors.append((name, message))
+        if self.allowed is not None:
+            for name in record:
+                if name not in self.allowed:
+                    errors.append((name, "is not a property of %s" % self.table))
+        return errors
+
+    def iter_errors(self, records):
+        """Validate a list or iterator of records.
+
+        Yields an (index, field, message) tuple per error as the records
+        are consumed.
+        """
+        checks = self.checks
+        allowed = self.allowed
+        for index, record in enumerate(records):
+            get = record.get
+            for name, check in checks:
+                message = check(get(name))
+                if message:
+                    yield (index, name, message)
+            if allowed is not None:
+                for name in record:
+                    if name not in allowed:
+                        yield (index, name, "is not a property of %s" % self.table)
+
+    def iter_column_errors(self, columns):
+        """Validate column oriented records, a dict of field -> sequence of
+        values, all sequences of the same length.
+
+        Yields (index, field, message) tuples ordered by field.
+        """
+        length = None
+        for values in columns.values():
+            length = len(values)
+            break
+        if length is None:
+            return
+        for name, check in self.checks:
+            values = columns.get(name)
+            if values is None:
+                values = [None] * length
+            for index, value in enumerate(values):
+                message = check(value)
+                if message:
+                    yield (index, name, message)
+        if self.allowed is not None:
+            for name in columns:
+                if name not in self.allowed:
+                    for index in range(length):
+                        yield (index, name, "is not a property of %s" % self.table)
+
+    def is_valid(self, record):
+        return not self.errors(record)